@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Continuous auto-tare for the load cell.
+
+Temperature drift slowly moves the HX711 zero point. The tracker watches the
+sampler for stable, unloaded stretches -- no pet around, weight within a
+gram of zero, raw counts barely moving -- and nudges the offset toward the
+observed baseline. Corrections are capped at a realistic drift rate
+(max_drift_gph). Trade-off: a stable load above max_zero_g (a few grams of
+leftover kibble) is never tared away, but one below it cannot be told apart
+from drift and is absorbed at max_drift_gph (0.8 g in about 25 minutes with
+the defaults). The offset is shifted without resetting the weight filter.
+It is persisted so a restart starts from the drifted zero instead of the
+factory constant. A persisted offset is only reused while it belongs to
+the same calibration revision; after a recalibration the fresh tare wins.
+"""
+
+import time
+
+import numpy as np
+
+from state_files import load_json, save_json_atomic
+
+
+class BaselineTracker:
+    """
+    stable_s        length of the quiet stretch required before updating
+    max_std_g       raw noise (in grams) allowed during that stretch
+    max_zero_g      only treat the scale as unloaded within +-max_zero_g of the current zero
+    gain            fraction of the observed error applied per update (0..1)...
+    max_drift_gph   ...but never more than this many grams per hour
+    check_every_s   minimum time between checks (update() can be called every frame)
+    persist_every_s minimum time between writes of the state file
+    calibration_rev revision of the calibration the offset is relative to
+    """
+
+    def __init__(self, sampler, state_path, stable_s=5.0, max_std_g=0.5, max_zero_g=1.0,
+                 gain=0.2, max_drift_gph=2.0, check_every_s=2.0, persist_every_s=600.0, calibration_rev=0):
+        self.sampler = sampler
+        self.state_path = state_path
+        self.stable_s = stable_s
+        self.max_std_g = max_std_g
+        self.max_zero_g = max_zero_g
+        self.gain = gain
+        self.max_drift_gph = max_drift_gph
+        self.check_every_s = check_every_s
+        self.persist_every_s = persist_every_s
+        self.calibration_rev = calibration_rev
+
+        self.boot_offset = sampler.offset
+        self.updates = 0
+        self.last_update = None      # wall-clock time of the last offset change
+        self._last_check = 0.0
+        self._last_correction = None
+        self._last_persist = 0.0
+        self._dirty = False
+
+    def load(self):
+        """Apply a persisted offset (if any) to the sampler. Returns the offset in use."""
+        state = load_json(self.state_path, {}) or {}
+        if "offset" in state and state.get("calibration_rev", 0) == self.calibration_rev:
+            self.sampler.set_calibration(offset=float(state["offset"]))
+            self.boot_offset = self.sampler.offset
+            self.last_update = state.get("updated")
+        return self.sampler.offset
+
+    def update(self, busy=False, now=None):
+        """
+        Call regularly from the control loop. `busy` (pet present, dispensing)
+        blocks updates. Returns True when the offset changed.
+        """
+        now = time.monotonic() if now is None else now
+        if busy or now - self._last_check < self.check_every_s:
+            return False
+        last = self._last_correction if self._last_correction is not None else now - self.check_every_s
+        elapsed = now - last
+        self._last_check = now
+
+        ts, raw = self.sampler.window(self.stable_s, raw=True)
+        if len(raw) < 5 or ts[-1] - ts[0] < 0.8 * self.stable_s:
+            return False
+
+        scale = self.sampler.scale
+        if np.std(raw) / abs(scale) > self.max_std_g:
+            return False
+        baseline = float(np.median(raw))
+        error_g = (baseline - self.sampler.offset) / scale
+        if abs(error_g) > self.max_zero_g:
+            return False    # something is on the scale (food left, bowl moved)
+
+        # Drift is slow: cap the step by the time since the last correction
+        max_step_g = self.max_drift_gph * min(elapsed, 3600.0) / 3600.0
+        step_g = max(-max_step_g, min(max_step_g, self.gain * error_g))
+        self._last_correction = now
+        if step_g == 0.0:
+            return False
+        self.sampler.shift_offset(step_g * scale)
+        self.updates += 1
+        self.last_update = time.time()
+        self._dirty = True
+        self._maybe_persist(now)
+        return True
+
+    def _maybe_persist(self, now, force=False):
+        if not self._dirty or (not force and now - self._last_persist < self.persist_every_s):
+            return
+        try:
+            save_json_atomic(self.state_path, {"offset": round(self.sampler.offset, 1),
+                                               "updated": self.last_update,
+                                               "calibration_rev": self.calibration_rev})
+            self._dirty = False
+            self._last_persist = now
+        except OSError as e:
+            print("[TARE] Could not save offset:", e)
+
+    def flush(self):
+        """Persist any pending offset change (call on shutdown)."""
+        self._maybe_persist(time.monotonic(), force=True)
+
+    def telemetry(self):
+        return {
+            "offset": round(self.sampler.offset, 1),
+            "calibration_rev": self.calibration_rev,
+            "drift_g": round((self.sampler.offset - self.boot_offset) / self.sampler.scale, 2),
+            "updates": self.updates,
+            "last_update": self.last_update,
+        }
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmark detector backends on recorded clips.
+
+Replays every clip in a directory through each backend / input size / thread
+count combination and reports latency percentiles, FPS, peak RSS and how well
+the detections agree with a reference configuration.
+
+Backends:
+  pt         ultralytics + PyTorch (.pt)
+  onnx       onnxruntime FP32
+  onnx-int8  onnxruntime, dynamically quantized (INT8 weights) copy of the FP32 model
+  opencv     OpenCV DNN on the FP32 ONNX model
+
+ONNX models are exported with a fixed input size unless `dynamic=True` is used,
+so --onnx may contain an {imgsz} placeholder:
+    yolo export model=yolov8n.pt format=onnx imgsz=320   # -> rename yolov8n_320.onnx
+    python3 bench_detectors.py clips/ --onnx models/yolov8n_{imgsz}.onnx --sizes 320 480 640
+
+Each configuration runs in its own process so peak RSS and thread settings
+don't leak between runs. Works on x86 Linux and on the Pi.
+
+Requirements:
+  pip install numpy opencv-python-headless onnxruntime   (+ ultralytics for "pt")
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detections import pick_species, to_detections
+from onnx_detector import OnnxDetector, SPECIES_CLASS_IDS
+
+CLIP_PATTERNS = ("*.mp4", "*.avi", "*.mkv", "*.mov", "*.h264")
+ALL_BACKENDS = ("pt", "onnx", "onnx-int8", "opencv")
+MATCH_IOU = 0.5
+
+
+# =========================
+# Helpers
+# =========================
+def find_clips(clip_dir):
+    clips = []
+    for pattern in CLIP_PATTERNS:
+        clips.extend(glob.glob(os.path.join(clip_dir, pattern)))
+    return sorted(clips)
+
+
+def iter_frames(clips, max_frames, stride):
+    """
+    Stream frames clip by clip (same order every run). Only one decoded frame
+    is held at a time, so a large clip directory fits on a Pi; decoding is
+    outside the timed detect() call.
+    """
+    for path in clips:
+        cap = cv2.VideoCapture(path)
+        idx = 0
+        taken = 0
+        try:
+            while taken < max_frames:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if idx % stride == 0:
+                    yield frame
+                    taken += 1
+                idx += 1
+        finally:
+            cap.release()
+
+
+def rss_mb(field):
+    """VmRSS / VmHWM from /proc (Linux); falls back to ru_maxrss."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def quantized_path(onnx_path):
+    """Create (once) an INT8 dynamic-quantized copy next to the FP32 model."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    root, ext = os.path.splitext(onnx_path)
+    out = f"{root}_int8{ext}"
+    if not os.path.exists(out) or os.path.getmtime(out) < os.path.getmtime(onnx_path):
+        print(f"[BENCH] Quantizing {onnx_path} -> {out}")
+        quantize_dynamic(onnx_path, out, weight_type=QuantType.QUInt8)
+    return out
+
+
+def box_iou(a, b):
+    """IoU matrix between xyxy boxes a[N,4] and b[M,4]."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_count(ref, cand):
+    """Greedy same-class matches with IoU >= MATCH_IOU."""
+    rb, _, rc = ref
+    cb, _, cc = cand
+    if len(rc) == 0 or len(cc) == 0:
+        return 0
+    iou = box_iou(rb, cb)
+    iou[rc[:, None] != cc[None, :]] = 0.0
+    matches = 0
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < MATCH_IOU:
+            return matches
+        matches += 1
+        iou[i, :] = 0.0
+        iou[:, j] = 0.0
+
+
+# =========================
+# Backends
+# =========================
+class UltralyticsBackend:
+    def __init__(self, model_path, imgsz, conf, iou, threads):
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.class_ids = np.array(sorted(SPECIES_CLASS_IDS))
+
+    def detect(self, frame):
+        r = self.model.predict(frame, imgsz=self.imgsz, conf=self.conf, iou=self.iou,
+                               verbose=False)[0]
+        xyxy = r.boxes.xyxy.cpu().numpy().astype(np.float32)
+        scores = r.boxes.conf.cpu().numpy().astype(np.float32)
+        cls = r.boxes.cls.cpu().numpy().astype(np.int64)
+        mask = np.isin(cls, self.class_ids)
+        return xyxy[mask], scores[mask], cls[mask]
+
+
+def build_backend(cfg, args):
+    name, imgsz, threads = cfg["backend"], cfg["imgsz"], cfg["threads"]
+    if name == "pt":
+        return UltralyticsBackend(args.pt, imgsz, args.conf, args.iou, threads)
+
+    onnx_path = args.onnx.format(imgsz=imgsz)
+    if name == "onnx":
+        return OnnxDetector(onnx_path, imgsz, args.conf, args.iou, backend="onnxruntime", threads=threads)
+    if name == "onnx-int8":
+        return OnnxDetector(quantized_path(onnx_path), imgsz, args.conf, args.iou,
+                            backend="onnxruntime", threads=threads)
+    if name == "opencv":
+        return OnnxDetector(onnx_path, imgsz, args.conf, args.iou, backend="opencv", threads=threads)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+# =========================
+# Runner (one process per config)
+# =========================
+def run_config(cfg, clips, args, out_queue):
+    try:
+        rss_base = rss_mb("VmRSS")
+
+        t_load = time.perf_counter()
+        backend = build_backend(cfg, args)
+        load_s = time.perf_counter() - t_load
+
+        latencies = []
+        detections = []
+        for i, frame in enumerate(iter_frames(clips, args.max_frames, args.stride)):
+            if i < args.warmup:
+                backend.detect(frame)    # warm-up pass, not timed
+            t0 = time.perf_counter()
+            det = backend.detect(frame)
+            latencies.append(time.perf_counter() - t0)
+            detections.append(det)
+        latencies = np.asarray(latencies, dtype=np.float64)
+
+        out_queue.put({
+            "config": cfg,
+            "frames": len(latencies),
+            "load_s": load_s,
+            "latencies": latencies,
+            "wall_s": float(latencies.sum()),     # detect time only, decoding excluded
+            "peak_rss_mb": rss_mb("VmHWM"),
+            "model_rss_mb": rss_mb("VmHWM") - rss_base,
+            "detections": detections,
+        })
+    except Exception as e:
+        out_queue.put({"config": cfg, "error": f"{type(e).__name__}: {e}"})
+
+
+def summarize(res, ref):
+    lat_ms = res["latencies"] * 1000.0
+    p50, p95, p99 = np.percentile(lat_ms, [50, 95, 99])
+    row = {
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "fps": round(res["frames"] / res["wall_s"], 2) if res["wall_s"] > 0 else 0.0,
+        "load_s": round(res["load_s"], 2),
+        "peak_rss_mb": round(res["peak_rss_mb"], 1),
+        "model_rss_mb": round(res["model_rss_mb"], 1),
+    }
+
+    if ref is not None:
+        matched = ref_total = cand_total = species_same = 0
+        for r, c in zip(ref["detections"], res["detections"]):
+            matched += match_count(r, c)
+            ref_total += len(r[2])
+            cand_total += len(c[2])
+            # Same decision rule as the feeder (detections.pick_species: pets first, then confidence)
+            species_same += (pick_species(to_detections(*r), SPECIES_CLASS_IDS)
+                             == pick_species(to_detections(*c), SPECIES_CLASS_IDS))
+        total = ref_total + cand_total
+        row["box_f1"] = round(2.0 * matched / total, 3) if total else 1.0
+        row["species_agree"] = round(species_same / max(1, res["frames"]), 3)
+    return row
+
+
+def config_label(cfg):
+    return f"{cfg['backend']}@{cfg['imgsz']}/t{cfg['threads']}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark IoTreat detector backends on recorded clips.")
+    ap.add_argument("clip_dir", help="directory of recorded clips")
+    ap.add_argument("--backends", nargs="+", default=list(ALL_BACKENDS), choices=ALL_BACKENDS)
+    ap.add_argument("--sizes", nargs="+", type=int, default=[320, 480, 640])
+    ap.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4])
+    ap.add_argument("--pt", default="yolov8n.pt", help="PyTorch model for the 'pt' backend")
+    ap.add_argument("--onnx", default="yolov8n.onnx", help="FP32 ONNX model (may contain {imgsz})")
+    ap.add_argument("--conf", type=float, default=0.5)
+    ap.add_argument("--iou", type=float, default=0.45)
+    ap.add_argument("--max-frames", type=int, default=200, help="frames taken per clip")
+    ap.add_argument("--stride", type=int, default=1, help="take every n-th frame of each clip")
+    ap.add_argument("--warmup", type=int, default=5)
+    ap.add_argument("--reference", default=None,
+                    help="reference config label, e.g. pt@640/t4 "
+                         "(default: the largest pt config that ran, else the largest one)")
+    ap.add_argument("--json", default=None, help="write results to this file")
+    args = ap.parse_args()
+
+    clips = find_clips(args.clip_dir)
+    if not clips:
+        print(f"[ERROR] No clips found in {args.clip_dir}")
+        sys.exit(1)
+    print(f"[BENCH] {len(clips)} clip(s), up to {args.max_frames} frames each")
+
+    configs = [{"backend": b, "imgsz": s, "threads": t}
+               for b, s, t in itertools.product(args.backends, args.sizes, args.threads)]
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for cfg in configs:
+        print(f"[BENCH] Running {config_label(cfg)} ...")
+        q = ctx.Queue()
+        p = ctx.Process(target=run_config, args=(cfg, clips, args, q))
+        p.start()
+        res = None
+        while res is None:
+            try:
+                res = q.get(timeout=1.0)
+            except queue.Empty:
+                if not p.is_alive():
+                    res = {"config": cfg, "error": f"worker exited with code {p.exitcode}"}
+        p.join()
+        if "error" in res:
+            print(f"[BENCH]   skipped: {res['error']}")
+            continue
+        results.append(res)
+
+    if not results:
+        print("[ERROR] No configuration ran successfully.")
+        sys.exit(1)
+
+    # Default reference: the most accurate setup, i.e. PyTorch at the largest input size
+    pt = [r for r in results if r["config"]["backend"] == "pt"] or results
+    ref = max(pt, key=lambda r: (r["config"]["imgsz"], r["config"]["threads"]))
+    if args.reference:
+        chosen = next((r for r in results if config_label(r["config"]) == args.reference), None)
+        if chosen is None:
+            print(f"[WARN] Reference {args.reference} did not run; using {config_label(ref['config'])}")
+        else:
+            ref = chosen
+    print(f"[BENCH] Reference: {config_label(ref['config'])}\n")
+
+    rows = []
+    header = f"{'config':<22}{'p50':>8}{'p95':>8}{'p99':>8}{'fps':>8}{'rss MB':>9}{'box F1':>8}{'species':>9}"
+    print(header)
+    print("-" * len(header))
+    for res in results:
+        row = summarize(res, ref)
+        row["config"] = config_label(res["config"])
+        rows.append(row)
+        print(f"{row['config']:<22}{row['p50_ms']:>8}{row['p95_ms']:>8}{row['p99_ms']:>8}"
+              f"{row['fps']:>8}{row['peak_rss_mb']:>9}{row['box_f1']:>8}{row['species_agree']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"reference": config_label(ref["config"]), "results": rows}, f, indent=2)
+        print(f"\n[BENCH] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Bowl-zone region of interest for the detector.
+
+Only the area around the bowl is cropped and fed to the model, so a smaller
+input size keeps the same pixels-per-pet where it matters. When a detection
+touches the crop edge (pet only partly inside) the zone grows step by step,
+and shrinks back to the configured zone after a quiet period.
+"""
+
+import time
+
+import numpy as np
+
+
+class BowlROI:
+    """
+    zone          (x1, y1, x2, y2) as fractions (0..1) of the frame
+    margin        extra border around the zone, as a fraction of zone size
+    expand_step   growth per edge hit, as a fraction of zone size
+    max_expand    cap on total growth (frame borders clamp it anyway)
+    edge_px       a box within this many pixels of an inner crop edge counts as touching
+    shrink_after_s  return to the base zone after this long without edge hits
+    """
+
+    def __init__(self, zone, margin=0.1, expand_step=0.25, max_expand=1.0,
+                 edge_px=4, shrink_after_s=30.0):
+        self.zone = zone
+        self.margin = margin
+        self.expand_step = expand_step
+        self.max_expand = max_expand
+        self.edge_px = edge_px
+        self.shrink_after_s = shrink_after_s
+
+        self.expand = 0.0
+        self._last_edge_hit = 0.0
+        self._rect = None        # last crop rect in pixels
+        self._frame_wh = None
+
+    def rect(self, frame_shape):
+        """Current crop rectangle (x1, y1, x2, y2) in pixels for a frame of this shape."""
+        h, w = frame_shape[:2]
+        zx1, zy1, zx2, zy2 = self.zone
+        grow = self.margin + self.expand
+        dx = (zx2 - zx1) * grow
+        dy = (zy2 - zy1) * grow
+        x1 = int(max(0.0, zx1 - dx) * w)
+        y1 = int(max(0.0, zy1 - dy) * h)
+        x2 = int(min(1.0, zx2 + dx) * w)
+        y2 = int(min(1.0, zy2 + dy) * h)
+        return x1, y1, x2, y2
+
+    def crop(self, frame):
+        """Return (crop_view, (offset_x, offset_y)). The crop is a view, no copy."""
+        x1, y1, x2, y2 = self.rect(frame.shape)
+        self._rect = (x1, y1, x2, y2)
+        self._frame_wh = (frame.shape[1], frame.shape[0])
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def to_frame(self, dets, offset):
+        """Shift a detections structured array from crop space to full-frame space."""
+        if len(dets) == 0:
+            return dets
+        out = dets.copy()
+        ox, oy = offset
+        out["x1"] += ox
+        out["x2"] += ox
+        out["y1"] += oy
+        out["y2"] += oy
+        return out
+
+    def update(self, dets, now=None, rect=None):
+        """
+        Feed crop-space detections from the last crop() (or from the crop `rect`
+        they were made on, for results that arrive later); grows the zone when a
+        box touches an inner edge (an edge that is not also the frame border).
+        """
+        now = time.monotonic() if now is None else now
+        rect = rect or self._rect
+        if rect is None:
+            return
+
+        x1, y1, x2, y2 = rect
+        fw, fh = self._frame_wh
+        cw, ch = x2 - x1, y2 - y1
+        e = self.edge_px
+
+        hit = False
+        if len(dets):
+            touch = np.zeros(len(dets), dtype=bool)
+            if x1 > 0:
+                touch |= dets["x1"] <= e
+            if y1 > 0:
+                touch |= dets["y1"] <= e
+            if x2 < fw:
+                touch |= dets["x2"] >= cw - 1 - e
+            if y2 < fh:
+                touch |= dets["y2"] >= ch - 1 - e
+            hit = bool(touch.any())
+
+        if hit:
+            self.expand = min(self.max_expand, self.expand + self.expand_step)
+            self._last_edge_hit = now
+        elif self.expand > 0.0 and now - self._last_edge_hit >= self.shrink_after_s:
+            self.expand = 0.0
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Load-cell calibration: interactive CLI + per-device calibration store.
+
+Calibrate (on the Pi, scale empty to start with):
+    python3 calibration.py --device IOTreat --cell bowl
+
+  1. tare: averages the raw reading with nothing on the scale
+  2. place one or more known masses; each is averaged the same way
+  3. least-squares fit raw = offset + scale * grams over all points
+  4. writes <state_dir>/calibration/<device>-<cell>.json (revision bumped)
+
+Runtime:
+    cal = load_calibration(path, default_offset=OFFSET, default_scale=SCALE)
+    cal.offset, cal.scale, cal.revision
+
+The parsed calibration is cached per (path, mtime), so repeated loads are a
+stat() call.
+"""
+
+import argparse
+import os
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from state_files import load_json, save_json_atomic
+
+FORMAT_VERSION = 1
+DEFAULT_STATE_DIR = "/home/cloudy7/iotreat"
+
+Calibration = namedtuple("Calibration", "offset scale revision device load_cell residual_g source")
+
+
+def calibration_path(state_dir, device, cell):
+    return os.path.join(state_dir, "calibration", f"{device}-{cell}.json")
+
+
+@lru_cache(maxsize=8)
+def _parse(path, mtime):
+    data = load_json(path)
+    if not isinstance(data, dict) or data.get("format_version") != FORMAT_VERSION:
+        return None
+    try:
+        return Calibration(float(data["offset"]), float(data["scale"]), int(data.get("revision", 0)),
+                           data.get("device"), data.get("load_cell"),
+                           data.get("residual_g"), path)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def load_calibration(path, default_offset, default_scale):
+    """Calibration from `path`, or the given defaults (revision 0) if missing/invalid."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    cal = _parse(path, mtime) if mtime is not None else None
+    if cal is None or cal.scale == 0:
+        return Calibration(float(default_offset), float(default_scale), 0, None, None, None, "defaults")
+    return cal
+
+
+def fit_linear(points):
+    """Least-squares raw = offset + scale * grams. Returns (offset, scale, max_residual_g)."""
+    n = len(points)
+    sx = sum(g for g, _ in points)
+    sy = sum(r for _, r in points)
+    sxx = sum(g * g for g, _ in points)
+    sxy = sum(g * r for g, r in points)
+    denom = n * sxx - sx * sx
+    if n < 2 or denom == 0:
+        raise ValueError("need at least two distinct masses (tare counts as 0 g)")
+    scale = (n * sxy - sx * sy) / denom
+    offset = (sy - scale * sx) / n
+    residual = max(abs((r - offset) / scale - g) for g, r in points)
+    return offset, scale, residual
+
+
+# =========================
+# Interactive CLI
+# =========================
+def average_raw(hx, seconds):
+    """Mean raw reading over `seconds` (median-trimmed against HX711 spikes)."""
+    from hx711_sampler import parse_raw
+
+    values = []
+    t_end = time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        values.extend(parse_raw(hx.get_raw_data()))
+    if not values:
+        raise RuntimeError("no readings from HX711")
+    values.sort()
+    k = len(values) // 5          # drop the outer 20% on each side
+    core = values[k:len(values) - k] or values
+    return sum(core) / len(core)
+
+
+def run_cli():
+    ap = argparse.ArgumentParser(description="Calibrate an IoTreat load cell.")
+    ap.add_argument("--device", default="IOTreat", help="device id (AWS client id)")
+    ap.add_argument("--cell", default="bowl", help="load cell name")
+    ap.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    ap.add_argument("--dt-pin", type=int, default=5)
+    ap.add_argument("--sck-pin", type=int, default=6)
+    ap.add_argument("--seconds", type=float, default=3.0, help="averaging time per point")
+    args = ap.parse_args()
+
+    import RPi.GPIO as GPIO
+    from hx711 import HX711
+
+    path = calibration_path(args.state_dir, args.device, args.cell)
+    previous = load_json(path, {}) or {}
+
+    GPIO.setmode(GPIO.BCM)
+    hx = HX711(args.dt_pin, args.sck_pin)
+    hx.reset()
+    hx.power_up()
+    time.sleep(0.2)
+
+    try:
+        input("[CAL] Remove everything from the scale, then press Enter to tare...")
+        tare_raw = average_raw(hx, args.seconds)
+        print(f"[CAL] Tare raw: {tare_raw:.0f}")
+        points = [(0.0, tare_raw)]
+
+        while True:
+            entry = input("[CAL] Place a known mass and enter its grams (blank to finish): ").strip()
+            if not entry:
+                break
+            try:
+                grams = float(entry)
+            except ValueError:
+                print("[CAL] Not a number, try again.")
+                continue
+            raw = average_raw(hx, args.seconds)
+            points.append((grams, raw))
+            print(f"[CAL] {grams:.1f} g -> raw {raw:.0f}")
+
+        offset, scale, residual = fit_linear(points)
+        print(f"[CAL] offset={offset:.1f}  scale={scale:.3f} counts/g  max residual={residual:.2f} g")
+
+        data = {
+            "format_version": FORMAT_VERSION,
+            "revision": int(previous.get("revision", 0)) + 1,
+            "device": args.device,
+            "load_cell": args.cell,
+            "offset": round(offset, 1),
+            "scale": round(scale, 4),
+            "residual_g": round(residual, 3),
+            "points": [[g, round(r, 1)] for g, r in points],
+            "created": int(time.time()),
+        }
+        save_json_atomic(path, data)
+        print(f"[CAL] Saved revision {data['revision']} to {path}")
+    finally:
+        hx.power_down()
+        GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    run_cli()
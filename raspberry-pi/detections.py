@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Shared post-processing for detector output.
+
+Turns YOLO results (ultralytics Results or plain arrays from OnnxDetector)
+into one compact NumPy structured array, filtered by class id and confidence
+with boolean masks instead of per-box Python loops.
+
+    dets = from_results(results, ALLOWED_CLASS_IDS, min_conf=0.35)
+    dets["cls"], dets["conf"], xyxy(dets)
+"""
+
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([
+    ("cls", np.int16),
+    ("conf", np.float32),
+    ("x1", np.float32),
+    ("y1", np.float32),
+    ("x2", np.float32),
+    ("y2", np.float32),
+])
+
+EMPTY = np.zeros(0, dtype=DETECTION_DTYPE)
+
+
+def to_detections(xyxy, conf, cls, allowed_ids=None, min_conf=0.0):
+    """Build a structured array from xyxy[N,4], conf[N], cls[N]; filter with masks."""
+    cls = np.asarray(cls).astype(np.int16, copy=False).reshape(-1)
+    conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+
+    mask = conf >= min_conf
+    if allowed_ids is not None:
+        mask &= np.isin(cls, np.fromiter(allowed_ids, dtype=np.int16))
+    if not mask.any():
+        return EMPTY
+
+    n = int(mask.sum())
+    out = np.empty(n, dtype=DETECTION_DTYPE)
+    out["cls"] = cls[mask]
+    out["conf"] = conf[mask]
+    box = xyxy[mask]
+    out["x1"], out["y1"], out["x2"], out["y2"] = box[:, 0], box[:, 1], box[:, 2], box[:, 3]
+    return out
+
+
+def from_results(results, allowed_ids=None, min_conf=0.0):
+    """
+    Convert an ultralytics Results list in one pass per result
+    (one .cpu().numpy() call per tensor, not per box).
+    """
+    parts = []
+    for r in results:
+        boxes = getattr(r, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            continue
+        parts.append(to_detections(boxes.xyxy.cpu().numpy(),
+                                   boxes.conf.cpu().numpy(),
+                                   boxes.cls.cpu().numpy(),
+                                   allowed_ids, min_conf))
+    if not parts:
+        return EMPTY
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def xyxy(dets):
+    """(N, 4) float32 box array view-copy of a detection array."""
+    return np.stack([dets["x1"], dets["y1"], dets["x2"], dets["y2"]], axis=1)
+
+
+def class_names(dets, names):
+    """Unique class names present, most confident first."""
+    if len(dets) == 0:
+        return []
+    order = np.argsort(-dets["conf"])
+    return list(dict.fromkeys(names[int(c)] for c in dets["cls"][order]))
+
+
+def pick_species(dets, names, preferred=("cat", "dog")):
+    """Most confident preferred species (pets), else most confident of anything, else None."""
+    if len(dets) == 0:
+        return None
+    labels = np.array([names[int(c)] for c in dets["cls"]])
+    pref = np.isin(labels, preferred)
+    pool = np.flatnonzero(pref) if pref.any() else np.arange(len(dets))
+    return str(labels[pool[dets["conf"][pool].argmax()]])
+
+
+def summary(dets, names):
+    """Compact one-line description for logs: 'cat:0.91 human:0.62'."""
+    return " ".join(f"{names[int(c)]}:{float(p):.2f}" for c, p in zip(dets["cls"], dets["conf"]))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Predictive dispense cutoff.
+
+Kibble is still falling when the motor stops, so running until
+`grams >= target` always overshoots. The controller estimates the live flow
+rate (g/s) from the HX711 sampler and stops the motor once
+
+    grams + flow_rate * lag_s >= target
+
+where lag_s ("seconds of food in the air") is learned per unit from the
+overshoot observed after each dispense and persisted to a small JSON profile.
+The motor runs at full duty for the bulk of the portion and ramps down to
+min_duty over the last slow_zone_g grams (motor profile), so the cutoff
+happens at a low, predictable flow. Every dispense reports its final error.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from dispenser_motor import DEFAULT_MOTOR_PROFILE
+from state_files import load_json, save_json_atomic
+
+
+class DispenseController:
+    """
+    sampler        HX711Sampler (filtered weight stream)
+    motor          PwmMotor / RelayMotor (set_duty(0..1), off())
+    profile_path   JSON file holding the learned lag for this unit
+    motor_profile  duty tuning, see dispenser_motor.DEFAULT_MOTOR_PROFILE
+    tolerance_g    a dispense within +-tolerance_g of the target counts as accurate
+    rate_window_s  flow rate = slope of the weight over this window
+    settle_s       wait this long after stopping before measuring the final weight
+    """
+
+    def __init__(self, sampler, motor, profile_path, motor_profile=None,
+                 tolerance_g=2.0, rate_window_s=0.6, settle_s=1.5,
+                 poll_s=0.01, timeout_s=30.0, learn_rate=0.3, max_lag_s=3.0):
+        self.sampler = sampler
+        self.motor = motor
+        self.motor_profile = dict(DEFAULT_MOTOR_PROFILE, **(motor_profile or {}))
+        self.profile_path = profile_path
+        self.tolerance_g = tolerance_g
+        self.rate_window_s = rate_window_s
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.timeout_s = timeout_s
+        self.learn_rate = learn_rate
+        self.max_lag_s = max_lag_s
+
+        self._abort = threading.Event()
+
+        profile = load_json(profile_path, {}) or {}
+        self.lag_s = float(profile.get("lag_s", 0.3))
+        self.dispenses = int(profile.get("dispenses", 0))
+
+    def flow_rate(self):
+        """Current flow in g/s (slope of the filtered weight), 0 if unknown."""
+        ts, grams = self.sampler.window(self.rate_window_s)
+        if len(ts) < 3 or ts[-1] - ts[0] < 0.1:
+            return 0.0
+        slope = np.polyfit(ts - ts[0], grams, 1)[0]
+        return max(0.0, float(slope))
+
+    def duty_for(self, remaining_g):
+        """Full duty far from the target, linear ramp to min_duty inside the slow zone."""
+        p = self.motor_profile
+        if remaining_g >= p["slow_zone_g"] or p["slow_zone_g"] <= 0:
+            return p["full_duty"]
+        frac = max(0.0, remaining_g) / p["slow_zone_g"]
+        return p["min_duty"] + (p["full_duty"] - p["min_duty"]) * frac
+
+    def _learn(self, in_flight_g, rate_at_stop):
+        if rate_at_stop < 0.5:   # too little flow to say anything about the lag
+            return
+        observed = min(self.max_lag_s, max(0.0, in_flight_g / rate_at_stop))
+        self.lag_s += self.learn_rate * (observed - self.lag_s)
+        self.dispenses += 1
+        try:
+            save_json_atomic(self.profile_path, {"lag_s": round(self.lag_s, 4),
+                                                 "dispenses": self.dispenses})
+        except OSError as e:
+            print("[DISPENSE] Could not save profile:", e)
+
+    def arm(self):
+        """
+        Clear a previous abort. Call before handing run() to another thread, not
+        inside run(): an abort() issued before run() starts must not be lost.
+        """
+        self._abort.clear()
+
+    def abort(self):
+        """Stop a running dispense from another thread (shutdown, cancelled task)."""
+        self._abort.set()
+
+    def run(self, target_grams, on_progress=None, progress_period_s=1.0):
+        """
+        Dispense until the predicted final weight reaches target_grams.
+        Returns a result dict (final weight, error, flow rate, learned lag, ...).
+        Returns at once (aborted) if abort() was called since the last arm().
+        """
+        t0 = time.monotonic()
+        start_g = self.sampler.latest_grams()
+        last_progress = t0
+        rate = 0.0
+        timed_out = False
+        full_s = 0.0        # time spent at full duty, for reporting
+
+        if not self._abort.is_set():
+            self.motor.set_duty(self.motor_profile["full_duty"])
+        try:
+            while not self._abort.is_set():
+                now = time.monotonic()
+                grams = self.sampler.latest_grams()
+                rate = self.flow_rate()
+                remaining = target_grams - (grams + rate * self.lag_s)
+                if remaining <= 0:
+                    break
+                duty = self.duty_for(remaining)
+                if duty >= self.motor_profile["full_duty"]:
+                    full_s = now - t0
+                self.motor.set_duty(duty)
+                if now - t0 >= self.timeout_s:
+                    timed_out = True
+                    break
+                if on_progress is not None and now - last_progress >= progress_period_s:
+                    on_progress(grams, rate)
+                    last_progress = now
+                time.sleep(self.poll_s)
+        finally:
+            self.motor.off()
+
+        stop_g = self.sampler.latest_grams()
+        t_stop = time.monotonic()
+        aborted = self._abort.wait(self.settle_s)
+        final_g = self.sampler.latest_grams()
+
+        in_flight = final_g - stop_g
+        if not (timed_out or aborted):
+            self._learn(in_flight, rate)
+
+        error = final_g - target_grams
+        return {
+            "target_grams": round(target_grams, 1),
+            "start_grams": round(start_g, 1),
+            "stop_grams": round(stop_g, 1),
+            "final_grams": round(final_g, 1),
+            "error_g": round(error, 1),
+            "within_tolerance": abs(error) <= self.tolerance_g,
+            "flow_gps": round(rate, 2),
+            "in_flight_g": round(in_flight, 1),
+            "lag_s": round(self.lag_s, 3),
+            "motor_s": round(t_stop - t0, 2),
+            "full_speed_s": round(full_s, 2),
+            "timed_out": timed_out,
+            "aborted": aborted,
+        }
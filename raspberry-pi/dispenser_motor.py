@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Variable-speed drivers for the dispenser motor.
+
+Both expose set_duty(0..1), off() and stop():
+  PwmMotor    hardware/software PWM on the motor driver's enable pin
+  RelayMotor  plain relay boards: "slow" is emulated with on/off bursts
+              (duty = on-time fraction of pulse_period_s)
+
+The GPIO module is passed in so this file imports fine off the Pi.
+"""
+
+import threading
+import time
+
+# Tuning for the two-speed / ramped dispense. Override per unit with a JSON
+# file (MOTOR_PROFILE_PATH, merged over these defaults in setup_device() of
+# petFeeder_CLOUDY7).
+DEFAULT_MOTOR_PROFILE = {
+    "mode": "relay",          # "relay" (stock on/off relay, pulsed bursts) or "pwm" (motor driver)
+    "pwm_freq": 200,          # Hz, PWM mode only
+    "pulse_period_s": 0.4,    # relay mode: one on/off burst cycle
+    "full_duty": 1.0,         # duty for the bulk of the portion
+    "min_duty": 0.3,          # duty right before the cutoff (must still move kibble)
+    "slow_zone_g": 12.0,      # start ramping down this many grams before the target
+}
+
+
+class PwmMotor:
+    def __init__(self, gpio, pin, freq=200):
+        self.gpio = gpio
+        self.pin = pin
+        self.pwm = gpio.PWM(pin, freq)
+        self.pwm.start(0.0)
+        self.duty = 0.0
+
+    def set_duty(self, duty):
+        duty = min(1.0, max(0.0, duty))
+        if duty != self.duty:
+            self.pwm.ChangeDutyCycle(duty * 100.0)
+            self.duty = duty
+
+    def off(self):
+        self.set_duty(0.0)
+
+    def stop(self):
+        try:
+            self.pwm.ChangeDutyCycle(0.0)
+            self.pwm.stop()
+        finally:
+            self.gpio.output(self.pin, self.gpio.LOW)
+
+
+class RelayMotor:
+    def __init__(self, gpio, pin, pulse_period_s=0.4):
+        self.gpio = gpio
+        self.pin = pin
+        self.pulse_period_s = pulse_period_s
+        self.duty = 0.0
+        self._wake = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="RelayMotor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            duty = self.duty
+            if duty <= 0.0:
+                self.gpio.output(self.pin, self.gpio.LOW)
+                self._wake.wait()
+                self._wake.clear()
+            elif duty >= 0.999:
+                self.gpio.output(self.pin, self.gpio.HIGH)
+                self._wake.wait()
+                self._wake.clear()
+            else:
+                # One burst cycle at the duty read above; a new duty in the same
+                # (bursting) range is picked up at the start of the next cycle
+                self.gpio.output(self.pin, self.gpio.HIGH)
+                time.sleep(duty * self.pulse_period_s)
+                if self.duty > 0.0:   # off() during the burst must not wait for the gap
+                    self.gpio.output(self.pin, self.gpio.LOW)
+                    self._wake.wait((1.0 - duty) * self.pulse_period_s)
+                    self._wake.clear()
+
+    @staticmethod
+    def _phase(duty):
+        """0 = off, 1 = bursting, 2 = continuously on."""
+        return 0 if duty <= 0.0 else (2 if duty >= 0.999 else 1)
+
+    def set_duty(self, duty):
+        duty = min(1.0, max(0.0, duty))
+        if duty != self.duty:
+            # Only off/bursting/on transitions wake the thread: the ramp changes
+            # the duty every poll, and waking on each would cut every gap short
+            wake = self._phase(duty) != self._phase(self.duty)
+            self.duty = duty
+            if duty <= 0.0:
+                self.gpio.output(self.pin, self.gpio.LOW)
+            if wake:
+                self._wake.set()
+
+    def off(self):
+        self.set_duty(0.0)
+
+    def stop(self):
+        self._running = False
+        self.off()
+        self._wake.set()
+        self._thread.join(1.0)
+        self.gpio.output(self.pin, self.gpio.LOW)
+
+
+def build_motor(gpio, pin, profile):
+    # PWM only on request: a mechanical relay cannot follow 200 Hz and just chatters
+    if profile.get("mode", "relay") == "pwm":
+        return PwmMotor(gpio, pin, profile.get("pwm_freq", 200))
+    return RelayMotor(gpio, pin, profile.get("pulse_period_s", 0.4))
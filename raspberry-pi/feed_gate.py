@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Weight- and cooldown-aware detection gating.
+
+Detection only matters when its result could trigger a dispense. Most of the
+day no species can be fed: every one is in cooldown, outside its feeding
+hours, or the bowl already holds its target portion. In that state the gate
+drops the detector to a low-rate presence-only mode (enough to keep the
+tracker, intake analyzer and auto-tare informed) and returns to full rate as
+soon as any species becomes eligible again.
+"""
+
+import time
+
+
+def in_feeding_hours(hours, now=None):
+    """True if `hours` ([start, end), local time, may wrap midnight) allows feeding now."""
+    if not hours:
+        return True
+    start, end = hours
+    t = time.localtime(now)
+    h = t.tm_hour + t.tm_min / 60.0
+    if start <= end:
+        return start <= h < end
+    return h >= start or h < end
+
+
+class FeedGate:
+    """
+    species           species that can be dispensed for
+    presence_every_s  detector interval while nothing is eligible
+    recheck_s         how often eligibility is re-evaluated
+    bowl_margin_g     treat the bowl as full within this many grams of the target
+    """
+
+    def __init__(self, species=("cat", "dog"), presence_every_s=5.0, recheck_s=1.0, bowl_margin_g=2.0):
+        self.species = tuple(species)
+        self.presence_every_s = presence_every_s
+        self.recheck_s = recheck_s
+        self.bowl_margin_g = bowl_margin_g
+
+        self.eligible = set(self.species)
+        self.reasons = {}
+        self.settings_version = None   # snapshot the current decision was made with
+        self._last_check = float("-inf")
+        self._last_presence = float("-inf")
+        self.frames = 0
+        self.skipped = 0
+
+    def update(self, bowl_grams, snap, cooldown_ok, now=None):
+        """
+        Re-evaluate (at most every recheck_s, or when the settings version
+        changes) which species could be fed.
+          bowl_grams    current filtered bowl weight (None if unknown)
+          snap          SettingsSnapshot ("grams", optional "hours": [start, end] per species)
+          cooldown_ok   callable(species) -> bool, evaluated against the same snapshot
+        Returns the set of eligible species.
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_check < self.recheck_s and snap.version == self.settings_version:
+            return self.eligible
+        self._last_check = now
+        self.settings_version = snap.version
+
+        eligible, reasons = set(), {}
+        for sp in self.species:
+            cfg = snap.species.get(sp, {})
+            target = cfg.get("grams", 0.0)
+            if target <= 0:
+                reasons[sp] = "no_portion"
+            elif not in_feeding_hours(cfg.get("hours")):
+                reasons[sp] = "schedule"
+            elif not cooldown_ok(sp):
+                reasons[sp] = "cooldown"
+            elif bowl_grams is not None and bowl_grams >= target - self.bowl_margin_g:
+                reasons[sp] = "bowl_full"
+            else:
+                eligible.add(sp)
+        self.eligible, self.reasons = eligible, reasons
+        return eligible
+
+    @property
+    def presence_only(self):
+        return not self.eligible
+
+    def should_infer(self, wants_detection, now=None):
+        """Filter the loop's own detection decision through the eligibility state."""
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        if not wants_detection:
+            return False
+        if self.presence_only and now - self._last_presence < self.presence_every_s:
+            self.skipped += 1
+            return False
+        self._last_presence = now
+        return True
+
+    def stats(self):
+        return {
+            "mode": "presence" if self.presence_only else "full",
+            "eligible": sorted(self.eligible),
+            "reasons": dict(self.reasons),
+            "settings_version": self.settings_version,
+            "frames": self.frames,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Background camera capture for the IoTreat detection loops.
+
+A reader thread pulls frames from cv2.VideoCapture as fast as the camera
+delivers them and keeps only the newest one, so inference always works on
+a fresh frame instead of whatever V4L2 buffered while the loop was busy
+(YOLO pass, dispense cycle, ...).
+"""
+
+import threading
+import time
+
+
+class FrameGrabber:
+    """
+    Reads frames on a daemon thread into a single latest-frame slot.
+
+    read() hands out the newest frame the consumer has not seen yet together
+    with its capture timestamp (time.monotonic()). Frames overwritten before
+    anyone picked them up are counted as dropped.
+    """
+
+    def __init__(self, cap, retry_delay=0.1):
+        self.cap = cap
+        self.retry_delay = retry_delay
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_ts = 0.0
+        self._seq = 0            # sequence number of the frame in the slot
+        self._consumed_seq = 0   # last sequence number handed to read()
+        self._running = False
+        self._thread = None
+
+        # Counters (read via stats())
+        self.captured = 0
+        self.dropped = 0
+        self.read_failures = 0
+        self.delivered = 0
+        self.last_age_s = 0.0
+        self.max_age_s = 0.0
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            ok, frame = self.cap.read()
+            ts = time.monotonic()
+            if not ok or frame is None:
+                self.read_failures += 1
+                time.sleep(self.retry_delay)
+                continue
+            with self._cond:
+                if self._seq != self._consumed_seq:
+                    # Previous frame was never picked up: it is stale now.
+                    self.dropped += 1
+                self._frame = frame
+                self._frame_ts = ts
+                self._seq += 1
+                self.captured += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Return (frame, capture_ts) for the newest unseen frame.
+        Blocks up to `timeout` seconds; returns (None, None) if nothing new arrived.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq == self._consumed_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return None, None
+                self._cond.wait(remaining)
+            frame, ts = self._frame, self._frame_ts
+            self._consumed_seq = self._seq
+
+        age = time.monotonic() - ts
+        self.delivered += 1
+        self.last_age_s = age
+        if age > self.max_age_s:
+            self.max_age_s = age
+        return frame, ts
+
+    def stats(self, reset_max=False):
+        """Counters snapshot suitable for logging / telemetry."""
+        out = {
+            "captured": self.captured,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "read_failures": self.read_failures,
+            "last_age_ms": round(self.last_age_s * 1000.0, 1),
+            "max_age_ms": round(self.max_age_s * 1000.0, 1),
+        }
+        if reset_max:
+            self.max_age_s = 0.0
+        return out
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Adaptive pacing for the detection loop.
+
+Picks the pause before the next frame from recent activity (fast while a pet
+is around or the scene is moving, slow after a quiet period) and stretches it
+when the SoC gets close to its throttle temperature, so an enclosed unit in
+summer keeps its inference headroom for when a pet actually walks up.
+"""
+
+import time
+
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp"
+
+
+def read_soc_temp_c(path=THERMAL_ZONE):
+    """SoC temperature in °C, or None if the thermal zone is not available."""
+    try:
+        with open(path) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+class AdaptiveScheduler:
+    """
+    fast_s         interval while a pet was seen / motion within active_hold_s
+    slow_s         interval between active_hold_s and quiet_after_s
+    idle_s         interval after quiet_after_s without activity
+    temp_soft_c    start backing off above this temperature
+    temp_hard_c    full back-off (max_thermal_factor) at/above this temperature
+    """
+
+    def __init__(self, fast_s=0.05, slow_s=0.25, idle_s=1.0,
+                 active_hold_s=30.0, quiet_after_s=120.0,
+                 temp_soft_c=70.0, temp_hard_c=80.0, max_thermal_factor=4.0,
+                 temp_poll_s=5.0, thermal_path=THERMAL_ZONE):
+        self.fast_s = fast_s
+        self.slow_s = slow_s
+        self.idle_s = idle_s
+        self.active_hold_s = active_hold_s
+        self.quiet_after_s = quiet_after_s
+        self.temp_soft_c = temp_soft_c
+        self.temp_hard_c = temp_hard_c
+        self.max_thermal_factor = max_thermal_factor
+        self.temp_poll_s = temp_poll_s
+        self.thermal_path = thermal_path
+
+        self._last_activity = time.monotonic()
+        self._last_temp_poll = 0.0
+        self.temp_c = None
+        self.thermal_factor = 1.0
+        self.last_interval = fast_s
+
+    def note_activity(self, pet_seen=False, motion=False, now=None):
+        if pet_seen or motion:
+            self._last_activity = time.monotonic() if now is None else now
+
+    def _update_thermal(self, now):
+        if now - self._last_temp_poll < self.temp_poll_s:
+            return
+        self._last_temp_poll = now
+        self.temp_c = read_soc_temp_c(self.thermal_path)
+        if self.temp_c is None or self.temp_c <= self.temp_soft_c:
+            self.thermal_factor = 1.0
+        elif self.temp_c >= self.temp_hard_c:
+            self.thermal_factor = self.max_thermal_factor
+        else:
+            span = (self.temp_c - self.temp_soft_c) / (self.temp_hard_c - self.temp_soft_c)
+            self.thermal_factor = 1.0 + span * (self.max_thermal_factor - 1.0)
+
+    def next_interval(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._update_thermal(now)
+
+        quiet = now - self._last_activity
+        if quiet <= self.active_hold_s:
+            base = self.fast_s
+        elif quiet <= self.quiet_after_s:
+            base = self.slow_s
+        else:
+            base = self.idle_s
+
+        self.last_interval = base * self.thermal_factor
+        return self.last_interval
+
+    def sleep(self, busy_s=0.0):
+        """Sleep for the next interval minus the time the loop already spent this round."""
+        remaining = self.next_interval() - busy_s
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def stats(self):
+        return {
+            "interval_ms": int(self.last_interval * 1000),
+            "quiet_s": int(time.monotonic() - self._last_activity),
+            "temp_c": self.temp_c,
+            "thermal_factor": round(self.thermal_factor, 2),
+        }
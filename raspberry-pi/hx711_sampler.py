@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Background HX711 sampler.
+
+Clocks the load cell continuously on its own thread and stores
+(monotonic_ts, raw) pairs in a preallocated NumPy ring buffer, together with
+the output of a streaming WeightFilter (spike rejection + median + smoother).
+Consumers get the latest filtered grams, a time window, or a Future that resolves when the weight
+crosses a threshold -- none of them block on the HX711 or sleep between
+samples, so the dispense loop reacts at the sensor's native rate.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+from weight_filter import WeightFilter
+
+
+def parse_raw(raw):
+    """Normalize get_raw_data() output (None, int or list) to a list of ints."""
+    if raw is None:
+        return []
+    if isinstance(raw, (list, tuple)):
+        return [int(r) for r in raw if r is not None]
+    return [int(raw)]
+
+
+class HX711Sampler:
+    """
+    hx          HX711 handle (reset/powered up already)
+    offset      raw reading at no load
+    scale       raw counts per gram
+    capacity    ring buffer size in samples
+    weight_filter  streaming filter applied to every sample (default WeightFilter())
+    """
+
+    def __init__(self, hx, offset, scale, capacity=2048, weight_filter=None):
+        self.hx = hx
+        self.offset = float(offset)
+        self.scale = float(scale)
+        self.capacity = capacity
+        self.filter = weight_filter or WeightFilter()
+
+        self._ts = np.zeros(capacity, dtype=np.float64)
+        self._raw = np.zeros(capacity, dtype=np.float64)
+        self._grams = np.zeros(capacity, dtype=np.float64)   # filtered
+        self._count = 0          # total samples written (index = count % capacity)
+        self._lock = threading.Lock()
+        self._watchers = []      # [(threshold_grams, Future)]
+        self._running = False
+        self._thread = None
+
+        self.read_failures = 0
+        self._last_read_ts = None
+        self._sample_dt = None   # estimated seconds per sample
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="HX711Sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            watchers, self._watchers = self._watchers, []
+        for _, fut in watchers:
+            fut.cancel()
+
+    def _run(self):
+        while self._running:
+            try:
+                values = parse_raw(self.hx.get_raw_data())
+            except Exception:
+                values = []
+            ts = time.monotonic()
+            if not values:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            # A read can return a batch of conversions: spread their timestamps
+            # back over the sample period instead of stamping them all `ts`
+            n = len(values)
+            step = 0.0
+            if self._last_read_ts is not None:
+                per = (ts - self._last_read_ts) / n
+                self._sample_dt = per if self._sample_dt is None else self._sample_dt + 0.1 * (per - self._sample_dt)
+                step = min(per, self._sample_dt)
+            self._last_read_ts = ts
+            with self._lock:
+                for k, v in enumerate(values):
+                    t_k = ts - (n - 1 - k) * step
+                    filtered = self.filter.update(t_k, self.to_grams(v))
+                    if filtered is None:
+                        continue  # nothing accepted yet
+                    i = self._count % self.capacity
+                    self._ts[i] = t_k
+                    self._raw[i] = v
+                    self._grams[i] = filtered
+                    self._count += 1
+            self._check_watchers()
+
+    # ---------- conversion ----------
+    def set_calibration(self, offset=None, scale=None):
+        with self._lock:
+            if offset is not None:
+                self.offset = float(offset)
+            if scale is not None:
+                self.scale = float(scale)
+            self.filter.reset()
+
+    def shift_offset(self, delta_raw):
+        """
+        Nudge the zero by delta_raw counts (auto-tare). Unlike set_calibration()
+        the filter keeps running: its state and the stored weights move along.
+        """
+        with self._lock:
+            delta_g = -float(delta_raw) / self.scale
+            self.offset += float(delta_raw)
+            self.filter.shift(delta_g)
+            self._grams += delta_g
+
+    def to_grams(self, raw):
+        return (raw - self.offset) / self.scale
+
+    # ---------- consumers ----------
+    def _last_idx(self, n):
+        """Ring indices of the last n samples, oldest first. Caller holds the lock."""
+        n = min(n, self._count, self.capacity)
+        end = self._count % self.capacity
+        return np.arange(end - n, end) % self.capacity
+
+    def latest(self):
+        """(ts, filtered_grams, raw) for the newest sample, or None before the first sample."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            i = (self._count - 1) % self.capacity
+            return float(self._ts[i]), float(self._grams[i]), float(self._raw[i])
+
+    def latest_grams(self, default=0.0):
+        cur = self.latest()
+        return max(0.0, cur[1]) if cur is not None else default
+
+    def window(self, seconds, raw=False):
+        """(ts[], filtered_grams[]) -- or (ts[], raw[]) -- for the last `seconds`, oldest first."""
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            idx = self._last_idx(self.capacity)
+            ts, values = self._ts[idx], (self._raw if raw else self._grams)[idx]
+        keep = ts >= cutoff
+        return ts[keep], values[keep]
+
+    def wait_until(self, grams):
+        """Future resolved with (ts, grams) once the latest weight is >= grams."""
+        fut = Future()
+        with self._lock:
+            self._watchers.append((grams, fut))
+        self._check_watchers()
+        return fut
+
+    def cancel_waits(self):
+        with self._lock:
+            watchers, self._watchers = self._watchers, []
+        for _, fut in watchers:
+            fut.cancel()
+
+    def _check_watchers(self):
+        if not self._watchers:
+            return
+        cur = self.latest()
+        if cur is None:
+            return
+        ts, grams, _ = cur
+        with self._lock:
+            fired = [(g, f) for g, f in self._watchers if grams >= g or f.done()]
+            self._watchers = [(g, f) for g, f in self._watchers if not (grams >= g or f.done())]
+        for _, fut in fired:
+            try:
+                fut.set_result((ts, grams))
+            except InvalidStateError:
+                pass  # cancelled by the consumer in the meantime
+
+    def stats(self):
+        with self._lock:
+            ts = self._ts[self._last_idx(self.capacity)]
+        span = ts[-1] - ts[0] if len(ts) > 1 else 0.0
+        out = {
+            "samples": self._count,
+            "read_failures": self.read_failures,
+            "rate_hz": round((len(ts) - 1) / span, 1) if span > 0 else 0.0,
+        }
+        out.update({f"filter_{k}": v for k, v in self.filter.stats().items()})
+        return out
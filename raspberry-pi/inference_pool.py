@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Multi-process detector pool with shared-memory frames.
+
+Each worker process owns its own OnnxDetector, so inference runs outside the
+main interpreter's GIL and the capture loop / MQTT callbacks stay responsive.
+Frames go through preallocated multiprocessing.shared_memory slots (one copy
+in, workers read a NumPy view); only small detection arrays come back. Every
+worker has its own pipe and the parent dispatches each frame to the least
+busy worker, so it always knows which frames a worker holds. Results are
+handed out in submission order.
+
+Create the pool before starting any threads (camera grabber, AWS client):
+the default "fork" context must not fork a process that already runs threads,
+and "spawn" would re-import the main script (GPIO setup and all) in every worker.
+For the same reason a worker that dies (OOM kill, crash in the runtime) is not
+restarted: poll() notices it, fails the frames dispatched to it and frees
+their slots, and the pool carries on with the survivors. There is no shared
+queue whose lock a dead worker could take with it. Once all workers are
+gone, poll() raises RuntimeError.
+"""
+
+import multiprocessing as mp
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from detections import EMPTY, to_detections
+
+
+def _worker_main(worker_id, detector_kwargs, slot_names, slot_bytes, conn):
+    # Imported here so the parent never loads a model it does not use.
+    from onnx_detector import OnnxDetector
+
+    shms = [shared_memory.SharedMemory(name=n) for n in slot_names]
+    try:
+        detector = OnnxDetector(**detector_kwargs)
+        conn.send(("ready", worker_id, None, None, None))
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                break       # parent went away
+            if task is None:
+                break
+            seq, slot, shape = task
+            t0 = time.perf_counter()
+            try:
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=shms[slot].buf)
+                dets = to_detections(*detector.detect(frame))
+                err = None
+            except Exception as e:
+                dets, err = EMPTY, f"{type(e).__name__}: {e}"
+            conn.send((seq, slot, dets, time.perf_counter() - t0, err))
+    finally:
+        conn.close()
+        for shm in shms:
+            shm.close()
+
+
+class InferencePool:
+    """
+    pool = InferencePool(2, {"model_path": ..., "imgsz": 320, ...}, max_frame_shape=(480, 640, 3))
+    seq = pool.submit(frame, meta)       # None when all slots are busy (backpressure)
+    for seq, dets, meta in pool.poll():  # completed results, in submission order
+        ...
+    """
+
+    def __init__(self, workers, detector_kwargs, max_frame_shape=(480, 640, 3),
+                 slots=None, context="fork", start_timeout=60.0):
+        self.workers = workers
+        self.slot_bytes = int(np.prod(max_frame_shape))
+        n_slots = slots or workers * 2
+
+        ctx = mp.get_context(context)
+        self._shms = [shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                      for _ in range(n_slots)]
+        self._free = list(range(n_slots))
+
+        kwargs = dict(detector_kwargs)
+        kwargs.setdefault("threads", 1)   # one core per worker; the pool provides the parallelism
+        names = [s.name for s in self._shms]
+        self._conns = []        # parent end of each worker's pipe
+        self._procs = []
+        for i in range(workers):
+            parent_end, child_end = ctx.Pipe()
+            p = ctx.Process(target=_worker_main, name=f"InferenceWorker-{i}", daemon=True,
+                            args=(i, kwargs, names, self.slot_bytes, child_end))
+            p.start()
+            child_end.close()
+            self._conns.append(parent_end)
+            self._procs.append(p)
+        self._assigned = [deque() for _ in range(workers)]   # seqs dispatched to each worker
+
+        self._next_seq = 0
+        self._next_out = 0
+        self._pending = {}      # seq -> meta for in-flight frames
+        self._slots = {}        # seq -> shared-memory slot of in-flight frames
+        self._alive = set(range(workers))
+        self._done = {}         # seq -> dets, waiting for earlier seqs
+
+        # Counters
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.worker_deaths = 0
+        self.busy_s = 0.0
+
+        self._wait_ready(start_timeout)
+
+    def _wait_ready(self, timeout):
+        waiting = set(self._conns)
+        deadline = time.monotonic() + timeout
+        while waiting:
+            try:
+                for conn in wait(list(waiting), max(0.1, deadline - time.monotonic())):
+                    if conn.recv()[0] == "ready":
+                        waiting.discard(conn)
+            except (EOFError, OSError):
+                pass    # a worker died while loading; reported below
+            if waiting and (time.monotonic() > deadline or not all(p.is_alive() for p in self._procs)):
+                self.close()
+                raise RuntimeError("Inference workers failed to start")
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def has_capacity(self):
+        return bool(self._free)
+
+    def submit(self, frame, meta=None):
+        """Copy the frame into a free slot and queue it. Returns seq, or None if full."""
+        if not self._alive:
+            raise RuntimeError("All inference workers died")
+        if not self._free:
+            self.rejected += 1
+            return None
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame {frame.shape}/{frame.dtype} does not fit a {self.slot_bytes}-byte slot")
+
+        slot = self._free.pop()
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shms[slot].buf)
+        np.copyto(view, frame)
+
+        seq = self._next_seq
+        self._next_seq += 1
+        self._pending[seq] = meta
+        self._slots[seq] = slot
+        self.submitted += 1
+        # Least busy live worker; a failed send means it died (handled by poll())
+        i = min(self._alive, key=lambda w: len(self._assigned[w]))
+        self._assigned[i].append(seq)
+        try:
+            self._conns[i].send((seq, slot, frame.shape))
+        except OSError:
+            pass
+        return seq
+
+    def poll(self, timeout=0.0):
+        """Collect finished work; returns [(seq, dets, meta), ...] in submission order."""
+        conns = {self._conns[i]: i for i in self._alive}
+        for conn in wait(list(conns), timeout):
+            self._drain(conns[conn])
+        self._reap_dead()
+
+        out = []
+        while self._next_out in self._done:
+            seq = self._next_out
+            out.append((seq, self._done.pop(seq), self._pending.pop(seq)))
+            self._next_out += 1
+        return out
+
+    def _drain(self, i):
+        """Collect every result worker i has sent so far."""
+        conn = self._conns[i]
+        try:
+            while conn.poll():
+                seq, slot, dets, busy, err = conn.recv()
+                self._assigned[i].remove(seq)
+                self._complete(seq, dets)
+                self.busy_s += busy
+                if err:
+                    self.errors += 1
+                    print("[POOL] Worker error:", err)
+        except (EOFError, OSError):
+            pass    # worker died; _reap_dead() fails what it still held
+
+    def _complete(self, seq, dets):
+        slot = self._slots.pop(seq, None)
+        if slot is None:
+            return      # already failed after its worker died
+        self._free.append(slot)
+        self._done[seq] = dets
+        self.completed += 1
+
+    def _reap_dead(self):
+        """Fail the frames a dead worker held (so in-order delivery moves on) and free their slots."""
+        for i in list(self._alive):
+            p = self._procs[i]
+            if p.is_alive():
+                continue
+            self._drain(i)      # results it sent before dying still count
+            self._alive.discard(i)
+            self.worker_deaths += 1
+            lost, self._assigned[i] = list(self._assigned[i]), deque()
+            print(f"[POOL] !!! Worker {i} died (exit code {p.exitcode}); "
+                  f"{len(self._alive)}/{self.workers} left, {len(lost)} frame(s) lost")
+            for seq in lost:
+                self.errors += 1
+                self._complete(seq, EMPTY)
+        if not self._alive:
+            raise RuntimeError("All inference workers died")
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "workers_alive": len(self._alive),
+            "worker_deaths": self.worker_deaths,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_infer_ms": round(self.busy_s / self.completed * 1000.0, 1) if self.completed else 0.0,
+        }
+
+    def close(self, timeout=2.0):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        for conn in self._conns:
+            conn.close()
+        for shm in self._shms:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._shms = []
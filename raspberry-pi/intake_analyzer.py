@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Eating-bout detection from the filtered bowl weight.
+
+Raw samples are useless while a pet is at the bowl (it noses, paws and leans
+on it), so the analyzer only trusts *stable levels*: stretches of stable_s
+where the filtered weight barely moves. Consecutive stable levels are
+compared:
+
+    level went down  -> food eaten (while a bout is open)
+    level went up    -> food added (dispense, manual refill)
+
+A bout opens when a pet is seen or the level drops, and closes after
+end_quiet_s without a pet and with a stable bowl. One summary dict is
+returned per bout that consumed at least min_bout_g; the species is the one
+seen most often during the bout.
+"""
+
+import time
+from collections import Counter
+
+import numpy as np
+
+
+class IntakeAnalyzer:
+    """
+    sampler         HX711Sampler (filtered weight stream)
+    stable_s        window that must be stable to count as a level
+    stable_std_g    max std of the filtered weight within that window
+    min_step_g      level changes smaller than this are noise
+    min_bout_g      bouts that consumed less are not reported (sniffing, bumping)
+    max_step_g      a drop larger than this is the bowl being lifted, not eating
+    end_quiet_s     no pet for this long (and a stable bowl) closes the bout
+    max_bout_s      force-close very long bouts
+    check_every_s   minimum time between checks (update() can be called every frame)
+    """
+
+    def __init__(self, sampler, stable_s=3.0, stable_std_g=0.8, min_step_g=0.5,
+                 min_bout_g=1.0, max_step_g=400.0, end_quiet_s=20.0,
+                 max_bout_s=1800.0, check_every_s=0.5):
+        self.sampler = sampler
+        self.stable_s = stable_s
+        self.stable_std_g = stable_std_g
+        self.min_step_g = min_step_g
+        self.min_bout_g = min_bout_g
+        self.max_step_g = max_step_g
+        self.end_quiet_s = end_quiet_s
+        self.max_bout_s = max_bout_s
+        self.check_every_s = check_every_s
+
+        self.level = None            # last stable level (g)
+        self.bouts = 0
+        self._last_check = 0.0
+        self._bout = None
+        self._last_pet = 0.0
+
+    def _stable_level(self):
+        ts, grams = self.sampler.window(self.stable_s)
+        if len(grams) < 5 or ts[-1] - ts[0] < 0.8 * self.stable_s:
+            return None
+        if np.std(grams) > self.stable_std_g:
+            return None
+        return float(np.median(grams))
+
+    def _open(self, now, level):
+        self._bout = {
+            "start": now,
+            "start_grams": level,
+            "consumed": 0.0,
+            "added": 0.0,
+            "species": Counter(),
+        }
+
+    def _close(self, now):
+        b, self._bout = self._bout, None
+        if b["consumed"] < self.min_bout_g:
+            return None
+        self.bouts += 1
+        wall = time.time() - now   # monotonic -> wall clock
+        species = b["species"].most_common(1)[0][0] if b["species"] else None
+        return {
+            "species": species,
+            "start_ts": int((wall + b["start"]) * 1000),
+            "end_ts": int((wall + now) * 1000),
+            "duration_s": round(now - b["start"], 1),
+            "grams_consumed": round(b["consumed"], 1),
+            "grams_added": round(b["added"], 1),
+            "start_grams": round(b["start_grams"], 1),
+            "end_grams": round(self.level, 1),
+        }
+
+    def update(self, species=None, now=None):
+        """
+        Call regularly from the control loop with the species currently at the
+        bowl (or None). Returns a bout summary dict when a bout ends, else None.
+        """
+        now = time.monotonic() if now is None else now
+        if species is not None:
+            self._last_pet = now
+            if self._bout is not None:
+                self._bout["species"][species] += 1
+        if now - self._last_check < self.check_every_s:
+            return None
+        self._last_check = now
+
+        level = self._stable_level()
+        if level is not None:
+            if self.level is None:
+                self.level = level
+            delta = level - self.level
+            if abs(delta) >= self.min_step_g:
+                if delta < 0 and -delta <= self.max_step_g:
+                    if self._bout is None:
+                        self._open(now, self.level)
+                    self._bout["consumed"] -= delta
+                elif delta > 0 and self._bout is not None:
+                    self._bout["added"] += delta
+                self.level = level
+
+        if self._bout is None:
+            if species is not None and self.level is not None:
+                self._open(now, self.level)
+                self._bout["species"][species] += 1
+            return None
+
+        quiet = now - self._last_pet >= self.end_quiet_s and level is not None
+        if quiet or now - self._bout["start"] >= self.max_bout_s:
+            return self._close(now)
+        return None
+
+    def stats(self):
+        return {
+            "level_g": None if self.level is None else round(self.level, 1),
+            "in_bout": self._bout is not None,
+            "bouts": self.bouts,
+        }
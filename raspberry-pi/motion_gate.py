@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Cheap motion pre-stage for the detection loops.
+
+Works on a small grayscale copy of each frame against a running-average
+background. The (expensive) detector only runs when enough pixels changed,
+for a short hold period after motion, or on a slow heartbeat so a pet that
+walked in while we were idle is still picked up.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    should_infer(frame) -> True when the detector should run on this frame.
+
+    threshold    fraction of pixels (0..1) that must change to count as motion
+    pixel_delta  per-pixel gray-level difference that counts as "changed"
+    alpha        background learning rate (running average)
+    size         (w, h) of the downscaled copy the gate works on
+    hold_s       keep passing frames this long after the last motion
+    heartbeat_s  run the detector at least this often even without motion
+    """
+
+    def __init__(self, threshold=0.02, pixel_delta=25, alpha=0.05,
+                 size=(160, 120), hold_s=2.0, heartbeat_s=10.0):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.alpha = alpha
+        self.size = size
+        self.hold_s = hold_s
+        self.heartbeat_s = heartbeat_s
+
+        self._bg = None
+        self._diff = None
+        self._last_motion = 0.0
+        self._last_pass = 0.0
+
+        # Counters
+        self.skipped = 0
+        self.passed = 0
+        self.passed_heartbeat = 0
+        self.last_fraction = 0.0
+
+    def reset(self):
+        """Forget the background (e.g. after the camera moved)."""
+        self._bg = None
+
+    def _changed_fraction(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+        if self._bg is None:
+            self._bg = small
+            self._diff = np.empty_like(small)
+            return 1.0
+
+        np.subtract(small, self._bg, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        fraction = float(np.count_nonzero(self._diff > self.pixel_delta)) / self._diff.size
+
+        # bg += alpha * (small - bg), in place
+        self._bg *= (1.0 - self.alpha)
+        self._bg += self.alpha * small
+        return fraction
+
+    def should_infer(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        fraction = self._changed_fraction(frame)
+        self.last_fraction = fraction
+
+        if fraction >= self.threshold:
+            self._last_motion = now
+
+        if now - self._last_motion <= self.hold_s:
+            self.passed += 1
+            self._last_pass = now
+            return True
+
+        if now - self._last_pass >= self.heartbeat_s:
+            self.passed += 1
+            self.passed_heartbeat += 1
+            self._last_pass = now
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        total = self.passed + self.skipped
+        return {
+            "passed": self.passed,
+            "passed_heartbeat": self.passed_heartbeat,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / total, 3) if total else 0.0,
+            "last_fraction": round(self.last_fraction, 4),
+        }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+asyncio MQTT link (aiomqtt) for the feeder runtime.
+
+One task owns the connection: it connects (TLS with the device certificate
+for AWS IoT, or plain TCP for a local Mosquitto broker), subscribes, hands
+incoming messages to their handlers and reconnects with exponential backoff.
+Other threads (the telemetry sender) publish through publish_threadsafe().
+"""
+
+import asyncio
+import ssl
+
+try:
+    import aiomqtt
+except ImportError:
+    aiomqtt = None
+
+
+class AsyncMqttLink:
+    """
+    host, port       broker (AWS IoT endpoint or a local broker)
+    client_id        MQTT client identifier
+    tls              (ca_path, cert_path, key_path) or None for plain TCP
+    subscriptions    {topic: handler(payload_bytes)}; handlers run on the event loop
+    on_online/on_offline  connection state callbacks (e.g. telemetry.set_online)
+    """
+
+    def __init__(self, host, port, client_id, tls=None, subscriptions=None,
+                 on_online=None, on_offline=None, keepalive=30,
+                 backoff_min_s=1.0, backoff_max_s=32.0, publish_timeout_s=5.0):
+        if aiomqtt is None:
+            raise RuntimeError("aiomqtt is not installed (pip install aiomqtt)")
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.tls = tls
+        self.subscriptions = dict(subscriptions or {})
+        self.on_online = on_online
+        self.on_offline = on_offline
+        self.keepalive = keepalive
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+        self.publish_timeout_s = publish_timeout_s
+
+        self.loop = None
+        self._client = None
+        self.connects = 0
+        self.received = 0
+
+    def _tls_params(self):
+        if self.tls is None:
+            return None
+        ca, cert, key = self.tls
+        return aiomqtt.TLSParameters(ca_certs=ca, certfile=cert, keyfile=key,
+                                     tls_version=ssl.PROTOCOL_TLS_CLIENT)
+
+    async def run(self):
+        """Connection task: connect, subscribe, dispatch; reconnect until cancelled."""
+        self.loop = asyncio.get_running_loop()
+        backoff = self.backoff_min_s
+        while True:
+            try:
+                async with aiomqtt.Client(self.host, self.port, identifier=self.client_id,
+                                          tls_params=self._tls_params(),
+                                          keepalive=self.keepalive) as client:
+                    for topic in self.subscriptions:
+                        await client.subscribe(topic, qos=1)
+                    self._client = client
+                    self.connects += 1
+                    backoff = self.backoff_min_s
+                    print(f"[MQTT] Connected to {self.host}:{self.port}")
+                    if self.on_online is not None:
+                        self.on_online()
+                    async for message in client.messages:
+                        self.received += 1
+                        handler = self.subscriptions.get(str(message.topic))
+                        if handler is not None:
+                            try:
+                                handler(message.payload)
+                            except Exception as e:
+                                print("[MQTT] Handler error:", e)
+            except aiomqtt.MqttError as e:
+                print(f"[MQTT] Connection lost: {e}; retrying in {backoff:.0f} s")
+            finally:
+                if self._client is not None and self.on_offline is not None:
+                    self.on_offline()
+                self._client = None
+            await asyncio.sleep(backoff)
+            backoff = min(self.backoff_max_s, backoff * 2)
+
+    async def publish(self, topic, payload, qos=1):
+        client = self._client
+        if client is None:
+            raise ConnectionError("MQTT offline")
+        await asyncio.wait_for(client.publish(topic, payload, qos=qos), self.publish_timeout_s)
+
+    def publish_threadsafe(self, topic, payload, qos=1):
+        """Blocking publish from a non-loop thread (raises if offline or on timeout)."""
+        if self.loop is None or self._client is None:
+            raise ConnectionError("MQTT offline")
+        fut = asyncio.run_coroutine_threadsafe(self.publish(topic, payload, qos), self.loop)
+        return fut.result(self.publish_timeout_s + 1.0)
+
+    def stats(self):
+        return {"connected": self._client is not None, "connects": self.connects,
+                "received": self.received}
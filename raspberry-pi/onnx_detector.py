@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Lightweight YOLOv8 detector for the Pi: ONNX Runtime or OpenCV DNN, no PyTorch.
+
+Export the model once on a dev machine:
+    yolo export model=yolov8n.pt format=onnx imgsz=640
+and copy the resulting .onnx file to the device.
+
+Requirements on the Pi:
+  pip install onnxruntime opencv-python-headless numpy
+  (onnxruntime is optional; OpenCV DNN is used when it is not installed)
+"""
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# COCO ids we care about -> species names used in SETTINGS
+SPECIES_CLASS_IDS = {0: "human", 15: "cat", 16: "dog"}
+
+
+def letterbox(img, size=640, color=114):
+    """
+    Resize keeping aspect ratio and pad to a size x size square.
+    Returns (padded, ratio, (pad_x, pad_y)) so boxes can be mapped back.
+    """
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_x = (size - new_w) // 2
+    pad_y = (size - new_h) // 2
+    out = cv2.copyMakeBorder(img, pad_y, size - new_h - pad_y, pad_x, size - new_w - pad_x,
+                             cv2.BORDER_CONSTANT, value=(color, color, color))
+    return out, r, (pad_x, pad_y)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Plain NumPy NMS over xyxy boxes. Returns kept indices, best score first."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """
+    YOLOv8 ONNX detector restricted to person/cat/dog.
+
+    detect(frame) -> (boxes_xyxy[N,4] float32, scores[N] float32, class_ids[N] int)
+    in original frame pixel coordinates.
+
+    backend: "onnxruntime", "opencv" or "auto" (onnxruntime if installed).
+    """
+
+    def __init__(self, model_path, imgsz=640, conf=0.5, iou=0.45,
+                 class_ids=SPECIES_CLASS_IDS, backend="auto", threads=None):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.class_ids = np.array(sorted(class_ids), dtype=np.int64)
+
+        if backend == "auto":
+            backend = "onnxruntime" if ort is not None else "opencv"
+        self.backend = backend
+
+        if backend == "onnxruntime":
+            if ort is None:
+                raise RuntimeError("onnxruntime is not installed")
+            opts = ort.SessionOptions()
+            if threads:
+                opts.intra_op_num_threads = int(threads)
+            self.session = ort.InferenceSession(model_path, sess_options=opts,
+                                                providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+        elif backend == "opencv":
+            if threads:
+                cv2.setNumThreads(int(threads))
+            self.net = cv2.dnn.readNetFromONNX(model_path)
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+    def _preprocess(self, frame):
+        padded, ratio, pad = letterbox(frame, self.imgsz)
+        blob = cv2.dnn.blobFromImage(padded, 1.0 / 255.0, swapRB=True)
+        return blob, ratio, pad
+
+    def _forward(self, blob):
+        if self.backend == "onnxruntime":
+            out = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            self.net.setInput(blob)
+            out = self.net.forward()
+        # YOLOv8 head: (1, 4 + num_classes, N) -> (N, 4 + num_classes)
+        return out[0].T
+
+    def _postprocess(self, preds, ratio, pad, frame_shape):
+        # Only look at the allowed class columns; everything else is ignored.
+        cls_scores = preds[:, 4 + self.class_ids]
+        best = cls_scores.argmax(axis=1)
+        scores = cls_scores[np.arange(cls_scores.shape[0]), best]
+
+        mask = scores >= self.conf
+        if not mask.any():
+            return (np.zeros((0, 4), np.float32), np.zeros(0, np.float32),
+                    np.zeros(0, np.int64))
+
+        xywh = preds[mask, :4]
+        scores = scores[mask].astype(np.float32)
+        class_ids = self.class_ids[best[mask]]
+
+        boxes = np.empty_like(xywh, dtype=np.float32)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        # Per-class NMS via coordinate offset (boxes of different classes never overlap)
+        offsets = (class_ids * (self.imgsz + 1)).astype(np.float32)[:, None]
+        keep = nms(boxes + offsets, scores, self.iou)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo letterbox
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= ratio
+        h, w = frame_shape[:2]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w - 1)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h - 1)
+        return boxes, scores, class_ids
+
+    def detect(self, frame):
+        blob, ratio, pad = self._preprocess(frame)
+        preds = self._forward(blob)
+        return self._postprocess(preds, ratio, pad, frame.shape)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Durable on-disk telemetry outbox (SQLite, WAL mode).
+
+Events that cannot be published (broker unreachable, publish timeout) are
+appended here instead of piling up in RAM, and replayed once the connection
+is back: highest priority first, oldest-first within a priority. Each stored
+body already carries its idempotency key (msg_id), so a replayed event that
+did reach the broker before can be de-duplicated downstream.
+
+  - fsync batching: pending rows are committed (WAL + synchronous=FULL, so
+    every commit is fsynced) once commit_every_s has passed or
+    commit_every_n rows are waiting, not per event. The owner calls
+    maybe_commit() on every wakeup so an idle outbox still gets committed
+  - byte cap: above max_bytes the oldest rows of the lowest priority are evicted
+  - compaction: events made obsolete by a newer one (progress of a finished
+    dispense, old scale baselines) are deleted before a replay
+  - only the telemetry sender thread touches the connection
+"""
+
+import os
+import sqlite3
+import time
+
+# event -> events whose newer occurrence makes it obsolete
+SUPERSEDED_BY = {
+    "dispense_progress": ("dispense_done", "dispense_timeout", "dispense_aborted"),
+    "scale_baseline": ("scale_baseline",),
+}
+
+
+class Outbox:
+    """
+    path            SQLite file (created if missing)
+    max_bytes       cap on stored event bodies; lowest-priority oldest rows are evicted above it
+    commit_every_s  commit (and fsync) pending appends at most this often...
+    commit_every_n  ...or after this many pending rows
+    """
+
+    def __init__(self, path, max_bytes=16_000_000, commit_every_s=1.0, commit_every_n=100):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.commit_every_s = commit_every_s
+        self.commit_every_n = commit_every_n
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level="DEFERRED")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS outbox ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "created REAL NOT NULL, "
+                         "size INTEGER NOT NULL, "
+                         "body TEXT NOT NULL)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(outbox)")}
+        if "event" not in columns:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN event TEXT NOT NULL DEFAULT ''")
+        if "prio" not in columns:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN prio INTEGER NOT NULL DEFAULT 1")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_prio ON outbox (prio DESC, id)")
+        self._db.commit()
+        self.count, self.bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self.appended = 0
+        self.replayed = 0
+        self.evicted = 0
+        self.compacted = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, items):
+        """Store [(event, prio, body)] (body = encoded JSON) in order."""
+        now = time.time()
+        rows = [(now, len(body), body, event, prio) for event, prio, body in items]
+        self._db.executemany("INSERT INTO outbox (created, size, body, event, prio) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+        self.count += len(rows)
+        self.bytes += sum(r[1] for r in rows)
+        self.appended += len(rows)
+        self._pending += len(rows)
+        if self.bytes > self.max_bytes:
+            self._evict()
+        self.maybe_commit()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.count:
+            rows = self._db.execute("SELECT id, size FROM outbox ORDER BY prio, id LIMIT 100").fetchall()
+            self._delete([r[0] for r in rows])
+            self.count -= len(rows)
+            self.bytes -= sum(size for _, size in rows)
+            self.evicted += len(rows)
+        self._pending += 1
+
+    def _delete(self, ids):
+        self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def compact(self, superseded_by=SUPERSEDED_BY):
+        """Drop events that a newer stored event makes obsolete. Returns rows removed."""
+        removed = 0
+        for event, newer in superseded_by.items():
+            marks = ",".join("?" * len(newer))
+            cur = self._db.execute(
+                f"DELETE FROM outbox WHERE event = ? AND id < "
+                f"(SELECT COALESCE(MAX(id), 0) FROM outbox WHERE event IN ({marks}))",
+                (event, *newer))
+            removed += cur.rowcount
+        if removed:
+            self.count, self.bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+            self.compacted += removed
+            self._pending += 1
+            self.maybe_commit(force=True)
+        return removed
+
+    @property
+    def pending(self):
+        """True while appended/acked rows are not committed yet."""
+        return self._pending > 0
+
+    def maybe_commit(self, force=False):
+        """Commit pending rows if they are due (or force). Cheap when nothing is pending."""
+        now = time.monotonic()
+        if self._pending and (force or self._pending >= self.commit_every_n
+                              or now - self._last_commit >= self.commit_every_s):
+            self._db.commit()
+            self._pending = 0
+            self._last_commit = now
+
+    def peek(self, n):
+        """Up to n rows to replay next (highest priority, then oldest) as [(id, body)]."""
+        return self._db.execute("SELECT id, body FROM outbox ORDER BY prio DESC, id LIMIT ?",
+                                (n,)).fetchall()
+
+    def ack(self, rows):
+        """Remove rows (as returned by peek) after they were published."""
+        if not rows:
+            return
+        self._delete([r[0] for r in rows])
+        self.count -= len(rows)
+        self.bytes -= sum(len(body) for _, body in rows)
+        self.replayed += len(rows)
+        self._pending += 1
+        self.maybe_commit()
+
+    def flush(self):
+        self.maybe_commit(force=True)
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def stats(self):
+        return {
+            "rows": self.count,
+            "bytes": self.bytes,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "evicted": self.evicted,
+            "compacted": self.compacted,
+        }
@@ -5,14 +5,22 @@ IoTreat integrated pipeline with live AWS settings:
 - AWS IoT publishes messages
 - Servo opens lid, food dispenses until HX711 reaches target weight
 - Per-species cooldowns are live-updated via AWS IoT subscribe
+
+Two runtimes (RUNTIME below):
+- "asyncio": capture/inference, dispensing and MQTT (aiomqtt, AWS IoT or a
+  local broker) run as cooperating tasks; servo moves and weight waits no
+  longer stall detection
+- "threads": the original blocking loop on the AWS IoT SDK
 """
 
+import asyncio
 import time
 import json
 import sys
 import traceback
-import threading
 import signal
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 
 
 # --- hardware & libs ---
@@ -24,18 +32,36 @@ import numpy as np
 from hx711 import HX711
 GPIO.cleanup()
 
-# AWS IoT SDK
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from frame_grabber import FrameGrabber
+from motion_gate import MotionGate
 
 # (Assumed) HX711 helper; replace with your actual module/class if different
 # from hx711 import HX711
 
-# (Assumed) YOLO (ultralytics); if your env differs, adapt the import/model load accordingly
-# from ultralytics import YOLO
+# YOLOv8 exported to ONNX; runs on onnxruntime or OpenCV DNN (no PyTorch on the Pi)
+from onnx_detector import OnnxDetector, SPECIES_CLASS_IDS
+from detections import to_detections
+from bowl_roi import BowlROI
+from tracker import IoUTracker
+from frame_scheduler import AdaptiveScheduler
+from inference_pool import InferencePool
+from preview_server import PreviewServer
+from hx711_sampler import HX711Sampler
+from dispense_controller import DispenseController
+from dispenser_motor import DEFAULT_MOTOR_PROFILE, build_motor
+from state_files import load_json
+from auto_tare import BaselineTracker
+from calibration import calibration_path, load_calibration
+from intake_analyzer import IntakeAnalyzer
+from feed_gate import FeedGate
+from telemetry import TelemetryPublisher
+from telemetry_policy import TelemetryPolicy
+from outbox import Outbox
+from settings_store import SettingsStore, VersionConflict
 
 # ------------- GPIO / Hardware Config -------------
 SERVO_PIN = 18           # PWM-capable pin
-DISPENSER_PIN = 23       # Motor relay pin (example)
+DISPENSER_PIN = 23       # Motor relay pin (or a motor driver with "mode": "pwm", see dispenser_motor.py)
 HX711_DT_PIN = 5         # HX711 DT
 HX711_SCK_PIN = 6        # HX711 SCK
 
@@ -43,7 +69,21 @@ PWM_FREQ = 50            # Typical for hobby servos
 SERVO_OPEN_DUTY = 7.5    # Tune to your horn angle
 SERVO_CLOSED_DUTY = 5.0  # Tune to your horn angle
 
-SLEEP_BETWEEN_FRAMES = 0.05
+# Remote preview (MJPEG over HTTP); off on production units
+PREVIEW_ENABLED = False
+PREVIEW_PORT = 8080
+PREVIEW_MAX_FPS = 5
+
+# Loop pacing: fast while a pet/motion was seen recently, slower when quiet,
+# stretched further when the SoC approaches its throttle temperature
+SLEEP_BETWEEN_FRAMES = 0.05  # active interval
+SLEEP_QUIET = 0.25           # after ACTIVE_HOLD_S without activity
+SLEEP_IDLE = 1.0             # after QUIET_AFTER_S without activity
+ACTIVE_HOLD_S = 30
+QUIET_AFTER_S = 120
+SOC_TEMP_SOFT_C = 70.0       # start backing off
+SOC_TEMP_HARD_C = 80.0       # Pi 4 firmware starts throttling around 80-85 °C
+CAMERA_STATS_EVERY_S = 30    # how often to log capture counters
 
 # ------------- AWS IoT (update endpoints and certificate file paths) -------------
 AWS_CLIENT_ID = "IOTreat"
@@ -56,19 +96,44 @@ AWS_CERT = "/home/cloudy7/Downloads/device-certificate.pem.crt"
 AWS_TOPIC = "iotreat/petFeeder"
 AWS_TOPIC_SUBSCRIBE = "iotreat/petFeederSettings"
 
+# ------------- Runtime -------------
+RUNTIME = "asyncio"          # "asyncio" (aiomqtt) or "threads" (AWSIoTPythonSDK, blocking loop)
+MQTT_HOST = AWS_HOST         # asyncio runtime only: e.g. "localhost" for a local Mosquitto broker
+MQTT_PORT = AWS_PORT         # 1883 for a plain local broker
+MQTT_TLS = True              # device-certificate TLS (AWS IoT); False for a plain local broker
+
 # ------------- Detection / Model -------------
-# MODEL_PATH = "/home/cloudy7/models/pets.pt"  # example; update to your .pt
+MODEL_PATH = "/home/cloudy7/models/yolov8n.onnx"  # yolo export model=yolov8n.pt format=onnx imgsz=320
+MODEL_IMGSZ = 320            # bowl crop is small; use 640 (and a 640 export) if BOWL_ZONE is None
+MODEL_BACKEND = "auto"       # "onnxruntime", "opencv" or "auto"
 CONF_THRESHOLD = 0.5
 NMS_IOU = 0.45
+INFERENCE_WORKERS = 0        # >0: run the detector in this many worker processes (Pi 4: 2-3)
+
+# Bowl zone: only this part of the frame goes to the detector (None = whole frame)
+BOWL_ZONE = (0.25, 0.35, 0.75, 1.0)   # x1, y1, x2, y2 as fractions of the frame
+BOWL_ZONE_MARGIN = 0.1                # extra border, fraction of zone size
+
+# Tracker: a species counts as present only after TRACK_CONFIRM_FRAMES matching
+# detector passes; while tracks are stable the detector runs every k-th frame only
+TRACK_CONFIRM_FRAMES = 3
+TRACK_KEYFRAME_EVERY = 5
+
+# Motion gate: only run the detector when the scene changes (plus a slow heartbeat)
+MOTION_THRESHOLD = 0.02      # fraction of changed pixels that wakes the detector
+MOTION_HEARTBEAT_S = 10.0    # run the detector at least this often anyway
+
+# Feed gate: when no species could be fed (cooldown, outside its hours, bowl
+# already at its portion) the detector drops to a presence-only rate
+PRESENCE_ONLY_EVERY_S = 5.0
 
 # ------------- Live Settings (defaults) -------------
-SETTINGS = {
+# Optional per species: "hours": [start, end] local feeding window (may wrap midnight)
+DEFAULT_SETTINGS = {
     "cat":   {"cooldown": 120, "grams": 50.0},
     "dog":   {"cooldown": 120, "grams": 50.0},
     "human": {"cooldown": 60,  "grams": 0.0},  # if "human" is used for gating only
 }
-SETTINGS_LOCK = threading.Lock()
-
 # Track last dispense time per species
 LAST_DISPENSE = {
     "cat": 0.0,
@@ -76,6 +141,9 @@ LAST_DISPENSE = {
     "human": 0.0
 }
 
+# Background telemetry sender (set up in main); the hot path only enqueues
+TELEMETRY = None
+
 # ------------- Graceful Exit Flag -------------
 RUNNING = True
 
@@ -108,18 +176,36 @@ def servo_close(pwm):
     time.sleep(0.3)
 
 
-def dispenser_on():
-    GPIO.output(DISPENSER_PIN, GPIO.HIGH)
-
+async def servo_move(pwm, duty):
+    """Non-blocking servo move for the asyncio runtime."""
+    pwm.ChangeDutyCycle(duty)
+    await asyncio.sleep(0.3)
 
-def dispenser_off():
-    GPIO.output(DISPENSER_PIN, GPIO.LOW)
 
-
-# Calibration values (UPDATE IF YOU RECALIBRATE)
+# Factory calibration, used until `calibration.py` has written a calibration
+# file for this device (see CALIBRATION_PATH)
 OFFSET = -131480   # No-load raw reading
 SCALE  = 1563.7    # Counts per gram
 
+DISPENSE_TIMEOUT_S = 30  # safety: stop the motor if the target is never reached
+PROGRESS_PERIOD_S = 1.0  # dispense_progress publish period
+DISPENSE_TOLERANCE_G = 2.0
+
+# Per-device state (learned dispenser lag, ...)
+STATE_DIR = "/home/cloudy7/iotreat"
+DISPENSE_PROFILE_PATH = f"{STATE_DIR}/dispense_profile.json"
+MOTOR_PROFILE_PATH = f"{STATE_DIR}/motor_profile.json"   # overrides DEFAULT_MOTOR_PROFILE keys
+TARE_STATE_PATH = f"{STATE_DIR}/tare.json"               # auto-tracked load-cell zero
+CALIBRATION_PATH = calibration_path(STATE_DIR, AWS_CLIENT_ID, "bowl")
+OUTBOX_PATH = f"{STATE_DIR}/outbox.db"                  # telemetry kept across outages/restarts
+OUTBOX_MAX_BYTES = 16_000_000
+SETTINGS_CACHE_PATH = f"{STATE_DIR}/settings.json"      # last applied settings (instant startup)
+
+# Copy-on-write snapshots: readers call SETTINGS.get() (no lock) and use that
+# snapshot for the whole decision; updates swap in a new version. Starts from
+# the on-disk cache when there is one, so no round trip to the cloud is needed.
+SETTINGS = SettingsStore(DEFAULT_SETTINGS, path=SETTINGS_CACHE_PATH)
+
 def hx711_init():
     """
     Initialize HX711 and return the handle.
@@ -132,107 +218,97 @@ def hx711_init():
     time.sleep(0.2)
     return hx
 
-def hx711_read_grams(hx_handle):
-    """
-    Read raw value and convert to grams using OFFSET/SCALE.
-    Handles list payloads and None safely.
-    Returns a non-negative float (grams).
-    """
-    raw = hx_handle.get_raw_data()
-
-    # Convert list → integer (some drivers return [value])
-    if isinstance(raw, list):
-        if not raw:
-            return 0.0
-        raw = raw[0]
-
-    if raw is None:
-        return 0.0
-
-    grams = (raw - OFFSET) / SCALE
-    return max(0.0, float(grams))
-
 # =========================
 # AWS IoT Helpers
 # =========================
 def build_aws_client():
+    # AWS IoT SDK: only needed by the "threads" runtime
+    from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+
     client = AWSIoTMQTTClient(AWS_CLIENT_ID)
     client.configureEndpoint(AWS_HOST, AWS_PORT)
     client.configureCredentials(AWS_ROOT_CA, AWS_PRIVATE_KEY, AWS_CERT)
 
     # Safe behavior
     client.configureAutoReconnectBackoffTime(1, 32, 20)
-    client.configureOfflinePublishQueueing(-1)   # infinite
-    client.configureDrainingFrequency(2)         # Hz
+    client.configureOfflinePublishQueueing(0)    # disabled: the telemetry outbox keeps events on disk
+    # (no configureDrainingFrequency: the telemetry outbox drains its own backlog adaptively)
     client.configureConnectDisconnectTimeout(10) # sec
     client.configureMQTTOperationTimeout(5)      # sec
     return client
 
 
-def publish_msg(aws_client, event, payload=None, qos=1):
+def make_msg(event, payload=None):
     msg = {"event": event, "ts": int(time.time()*1000)}
     if payload:
         msg.update(payload)
-    try:
-        aws_client.publish(AWS_TOPIC, json.dumps(msg), qos)
-    except Exception as e:
-        print("[AWS] Publish error:", e)
+    return msg
+
 
+def publish_msg(telemetry, event, payload=None):
+    """Queue an event for the background sender (never blocks on the broker)."""
+    telemetry.publish(make_msg(event, payload))
 
-# Subscription callback: update SETTINGS from incoming JSON
+
+# Subscription callback (AWS IoT SDK): update SETTINGS from incoming JSON
 def on_settings_message(client, userdata, message):
     print("\n=== AWS SETTINGS RECEIVED ===")
     print("Topic:", message.topic)
+    apply_settings_payload(message.payload)
+
+
+def apply_settings_payload(payload):
+    """Apply a settings document (bytes) from iotreat/petFeederSettings."""
     try:
-        payload_str = message.payload.decode("utf-8", errors="replace")
+        payload_str = payload.decode("utf-8", errors="replace")
         print("Raw payload:", payload_str)
         incoming = json.loads(payload_str)
     except Exception as e:
         print("Payload decode/JSON error:", e, "\n")
         return
 
-    updated = {}
-
-    def apply_update(species, fields):
-        nonlocal updated
-        species = str(species).lower()
-        if species not in SETTINGS:
-            return
-        with SETTINGS_LOCK:
-            if "cooldown" in fields:
-                try:
-                    cd = int(fields["cooldown"])
-                    if cd >= 0:
-                        SETTINGS[species]["cooldown"] = cd
-                except Exception:
-                    pass
-            if "grams" in fields:
-                try:
-                    g = float(fields["grams"])
-                    if g >= 0:
-                        SETTINGS[species]["grams"] = g
-                except Exception:
-                    pass
-            updated[species] = dict(SETTINGS[species])
-
     # Accept either:
-    # 1) Flat: {"species": "cat", "cooldown": 90, "grams": 40}
-    # 2) Map:  {"cat": {"cooldown": 90, "grams": 40}, "dog": {"cooldown": 150}}
-    if isinstance(incoming, dict) and "species" in incoming:
-        apply_update(incoming.get("species"), incoming)
+    # 1) Delta: {"base_version": 7, "delta": {"cat": {"grams": 40}}}  (compare-and-set;
+    #    base_version may be omitted to apply unconditionally)
+    # 2) Flat:  {"species": "cat", "cooldown": 90, "grams": 40}
+    # 3) Map:   {"cat": {"cooldown": 90, "grams": 40}, "dog": {"cooldown": 150}}
+    base_version = None
+    if isinstance(incoming, dict) and isinstance(incoming.get("delta"), dict):
+        changes = incoming["delta"]
+        base_version = incoming.get("base_version")
+    elif isinstance(incoming, dict) and "species" in incoming:
+        changes = {incoming.get("species"): incoming}
     elif isinstance(incoming, dict):
-        for sp, fields in incoming.items():
-            if isinstance(fields, dict):
-                apply_update(sp, fields)
+        changes = incoming
+    else:
+        changes = {}
 
-    if updated:
-        print("Updated settings:", updated, "\n")
+    # Validated and swapped in as one new snapshot; readers never see a partial update
+    try:
+        snap, delta = SETTINGS.update(changes, base_version=base_version)
+    except VersionConflict as e:
+        # Stale desired state: report the full current settings so the backend can rebase
+        print("Settings rejected:", e, "\n")
+        cur = SETTINGS.get()
         try:
-            publish_msg(client, "settings_updated", {"updated": updated})
+            publish_msg(TELEMETRY, "settings_rejected", {"reason": "version_conflict",
+                                                         "base_version": e.base_version,
+                                                         "settings_version": cur.version,
+                                                         "settings": cur.as_dict()})
         except Exception:
             pass
+        return
+
+    if delta:
+        print(f"Updated settings (v{snap.version}):", delta, "\n")
     else:
-        print("No valid setting fields found.\n")
+        print("No setting changes.\n")
+    # Reported state: the new version and only what changed (also acks a no-op delta)
+    try:
+        publish_msg(TELEMETRY, "settings_reported", {"settings_version": snap.version,
+                                                     "delta": delta})
+    except Exception:
+        pass
 
 
 # =========================
@@ -244,63 +320,171 @@ def open_camera():
         raise RuntimeError("Camera not available")
     cap.set(cv2.CAP_PROP_FRAME_WIDTH,  640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)   # FrameGrabber keeps the newest frame anyway
     return cap
 
 
-def detect_species(frame):
+def detector_kwargs():
+    return {"model_path": MODEL_PATH, "imgsz": MODEL_IMGSZ, "conf": CONF_THRESHOLD,
+            "iou": NMS_IOU, "backend": MODEL_BACKEND}
+
+
+def load_detector():
+    return OnnxDetector(**detector_kwargs())
+
+
+def run_detector(detector, frame, roi=None):
     """
-    Return one of {"cat","dog","human",None} based on your actual detector.
-    This is a stub; plug in your YOLO inference here and map labels→species.
+    Detections (structured array, full-frame coordinates) for one frame.
+    With `roi`, only the bowl zone is run through the model.
     """
-    # Example passthrough: always return None
-    return None, frame  # (species, annotated_frame)
+    if roi is None:
+        return to_detections(*detector.detect(frame))
+    crop, offset = roi.crop(frame)
+    dets = to_detections(*detector.detect(crop))
+    roi.update(dets)
+    return roi.to_frame(dets, offset)
+
+
+def submit_detection(pool, frame, roi=None):
+    """Queue a frame (or its bowl-zone crop) on the worker pool; None if the pool is full."""
+    if roi is None:
+        return pool.submit(frame)
+    crop, offset = roi.crop(frame)
+    return pool.submit(crop, (offset, roi.rect(frame.shape)))
+
+
+def collect_detections(pool, roi=None):
+    """Finished pool results, in order, as full-frame detection arrays."""
+    out = []
+    for _, dets, meta in pool.poll():
+        if meta is not None:
+            offset, rect = meta
+            roi.update(dets, rect=rect)
+            dets = roi.to_frame(dets, offset)
+        out.append(dets)
+    return out
+
+
+def annotate(frame, boxes, roi=None):
+    """Draw (species, conf, x1, y1, x2, y2[, track_id]) boxes on a copy of the frame."""
+    annotated = frame.copy()
+    if roi is not None:
+        rx1, ry1, rx2, ry2 = roi.rect(frame.shape)
+        cv2.rectangle(annotated, (rx1, ry1), (rx2, ry2), (255, 128, 0), 1)
+    for box in boxes:
+        name, conf, x1, y1, x2, y2 = box[:6]
+        label = f"{name} {conf:.2f}" if len(box) < 7 else f"#{box[6]} {name} {conf:.2f}"
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(annotated, label, (x1, max(0, y1 - 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return annotated
 
 
 # =========================
 # Dispense Logic
 # =========================
-def can_dispense(species):
-    now = time.time()
-    with SETTINGS_LOCK:
-        cd = SETTINGS.get(species, {}).get("cooldown", 60)
+def can_dispense(species, snap=None):
+    snap = snap or SETTINGS.get()
+    cd = snap.get(species, "cooldown", 60)
     last = LAST_DISPENSE.get(species, 0.0)
-    return (now - last) >= cd
+    return (time.time() - last) >= cd
 
 
 def mark_dispensed(species):
     LAST_DISPENSE[species] = time.time()
 
 
-def dispense_to_target(hx_handle, pwm, species, aws_client):
-    with SETTINGS_LOCK:
-        target_grams = SETTINGS.get(species, {}).get("grams", 50.0)
+def cooldown_msg(species, active, snap):
+    since = time.time() - LAST_DISPENSE.get(species, 0.0)
+    return make_msg("cooldown_active", {
+        "species": species,
+        "active": active,
+        "cooldown_s": snap.get(species, "cooldown", 60),
+        "elapsed_s": int(since),
+        "settings_version": snap.version,
+    })
+
+
+def dispense_begin(species, telemetry, snap):
+    """Target grams for this dispense (and announce it), or None to skip."""
+    target_grams = snap.get(species, "grams", 50.0)
 
     if target_grams <= 0:
-        publish_msg(aws_client, "skip_dispense", {"species": species, "reason": "target_grams<=0"})
-        return
+        publish_msg(telemetry, "skip_dispense", {"species": species, "reason": "target_grams<=0",
+                                                 "settings_version": snap.version})
+        return None
 
-    publish_msg(aws_client, "dispense_start", {"species": species, "target_grams": target_grams})
-    try:
-        servo_open(pwm)
-        dispenser_on()
+    publish_msg(telemetry, "dispense_start", {"species": species, "target_grams": target_grams,
+                                              "settings_version": snap.version})
+    return target_grams
 
-        t0 = time.time()
-        while True:
-            grams = hx711_read_grams(hx_handle)
-            # Optional: publish progress sparsely
-            if int((time.time() - t0) * 10) % 10 == 0:  # ~1 Hz
-                publish_msg(aws_client, "dispense_progress", {"species": species, "grams": grams})
 
-            if grams >= target_grams:
-                break
-            time.sleep(0.05)
+def progress_publisher(species, telemetry):
+    def on_progress(grams, flow_gps):
+        publish_msg(telemetry, "dispense_progress",
+                    {"species": species, "grams": round(grams, 1), "flow_gps": round(flow_gps, 2)})
+    return on_progress
+
+
+def dispense_finish(species, target_grams, result, telemetry, snap):
+    mark_dispensed(species)
+    result["species"] = species
+    result["settings_version"] = snap.version
+    result["reached_grams"] = result["final_grams"]
+    print(f"[DISPENSE] {species}: {result['final_grams']} g (target {target_grams}, "
+          f"error {result['error_g']:+} g, lag {result['lag_s']} s)")
+    if result["aborted"]:
+        event = "dispense_aborted"
+    else:
+        event = "dispense_timeout" if result["timed_out"] else "dispense_done"
+    publish_msg(telemetry, event, result)
+
 
+def dispense_to_target(controller, pwm, species, telemetry, snap=None):
+    snap = snap or SETTINGS.get()
+    target_grams = dispense_begin(species, telemetry, snap)
+    if target_grams is None:
+        return
+    try:
+        servo_open(pwm)
+        # Stops the motor early, by the learned in-flight lag, and measures the final weight
+        controller.arm()
+        result = controller.run(target_grams, progress_publisher(species, telemetry), PROGRESS_PERIOD_S)
     finally:
-        dispenser_off()
+        controller.motor.off()
         servo_close(pwm)
+    dispense_finish(species, target_grams, result, telemetry, snap)
 
-    mark_dispensed(species)
-    publish_msg(aws_client, "dispense_done", {"species": species, "reached_grams": float(target_grams)})
+
+async def dispense_async(dev, species, telemetry, executor, snap):
+    """
+    asyncio version: servo moves are awaited and the weight-driven motor loop
+    runs on `executor`, so detection keeps running. Cancellation (shutdown)
+    or an overrun aborts the motor loop before the lid closes.
+    """
+    target_grams = dispense_begin(species, telemetry, snap)
+    if target_grams is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        await servo_move(dev.pwm, SERVO_OPEN_DUTY)
+        dev.controller.arm()     # before submitting, so a cancel from here on is not lost
+        fut = loop.run_in_executor(executor, dev.controller.run, target_grams,
+                                   progress_publisher(species, telemetry), PROGRESS_PERIOD_S)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(fut), DISPENSE_TIMEOUT_S + 5)
+        except asyncio.TimeoutError:
+            dev.controller.abort()
+            result = await fut
+        except asyncio.CancelledError:
+            dev.controller.abort()
+            dispense_finish(species, target_grams, await fut, telemetry, snap)
+            raise
+    finally:
+        dev.controller.motor.off()
+        await servo_move(dev.pwm, SERVO_CLOSED_DUTY)
+    dispense_finish(species, target_grams, result, telemetry, snap)
 
 
 # =========================
@@ -311,25 +495,217 @@ def handle_sigint(sig, frame):
     RUNNING = False
 
 
-def main():
-    global RUNNING
+def setup_device():
+    """Bring up GPIO, scale, dispenser, detector and camera. Returns the parts as a namespace."""
+    dev = SimpleNamespace(dispensing=False, last_stats=time.monotonic(), published_tare_updates=0)
+
+    snap = SETTINGS.get()
+    print(f"[INIT] Settings: v{snap.version} ({SETTINGS.source})")
+    # Model first: the worker pool forks, which is only safe before any thread exists
+    # (HX711 sampler, relay motor, PWM, frame grabber all start threads below)
+    print("[INIT] Model...")
+    dev.pool, dev.detector = None, None
+    if INFERENCE_WORKERS > 0:
+        dev.pool = InferencePool(INFERENCE_WORKERS, detector_kwargs(), max_frame_shape=(480, 640, 3))
+        print(f"[INIT] Inference pool: {INFERENCE_WORKERS} worker process(es)")
+    else:
+        dev.detector = load_detector()
+        print(f"[INIT] Detector backend: {dev.detector.backend}")
 
     print("[INIT] GPIO/Hardware...")
     gpio_init()
-    pwm = GPIO.PWM(SERVO_PIN, PWM_FREQ)
-    pwm.start(SERVO_CLOSED_DUTY)
+    dev.pwm = GPIO.PWM(SERVO_PIN, PWM_FREQ)
+    dev.pwm.start(SERVO_CLOSED_DUTY)
 
     print("[INIT] HX711...")
-    hx_handle = hx711_init()
+    dev.hx = hx711_init()
+    cal = load_calibration(CALIBRATION_PATH, OFFSET, SCALE)
+    print(f"[INIT] HX711 calibration: rev {cal.revision} ({cal.source}), scale {cal.scale:.1f} counts/g")
+    dev.sampler = HX711Sampler(dev.hx, cal.offset, cal.scale).start()
+    dev.baseline = BaselineTracker(dev.sampler, TARE_STATE_PATH, calibration_rev=cal.revision)
+    print(f"[INIT] HX711 offset: {dev.baseline.load():.0f}")
+    dev.intake = IntakeAnalyzer(dev.sampler)
+    motor_profile = dict(DEFAULT_MOTOR_PROFILE, **(load_json(MOTOR_PROFILE_PATH, {}) or {}))
+    dev.motor = build_motor(GPIO, DISPENSER_PIN, motor_profile)
+    print(f"[INIT] Dispenser motor: {motor_profile['mode']} "
+          f"(full {motor_profile['full_duty']}, min {motor_profile['min_duty']}, "
+          f"slow zone {motor_profile['slow_zone_g']} g)")
+    dev.controller = DispenseController(dev.sampler, dev.motor, DISPENSE_PROFILE_PATH, motor_profile,
+                                        tolerance_g=DISPENSE_TOLERANCE_G, timeout_s=DISPENSE_TIMEOUT_S)
+
+    dev.roi = BowlROI(BOWL_ZONE, margin=BOWL_ZONE_MARGIN) if BOWL_ZONE else None
+    dev.tracker = IoUTracker(confirm_frames=TRACK_CONFIRM_FRAMES, keyframe_every=TRACK_KEYFRAME_EVERY)
+    dev.scheduler = AdaptiveScheduler(fast_s=SLEEP_BETWEEN_FRAMES, slow_s=SLEEP_QUIET, idle_s=SLEEP_IDLE,
+                                      active_hold_s=ACTIVE_HOLD_S, quiet_after_s=QUIET_AFTER_S,
+                                      temp_soft_c=SOC_TEMP_SOFT_C, temp_hard_c=SOC_TEMP_HARD_C)
 
     print("[INIT] Camera...")
-    cap = open_camera()
+    dev.cap = open_camera()
+    dev.grabber = FrameGrabber(dev.cap).start()
+    dev.gate = MotionGate(threshold=MOTION_THRESHOLD, heartbeat_s=MOTION_HEARTBEAT_S)
+    dev.feed_gate = FeedGate(presence_every_s=PRESENCE_ONLY_EVERY_S)
+    dev.preview = PreviewServer(PREVIEW_PORT, max_fps=PREVIEW_MAX_FPS).start() if PREVIEW_ENABLED else None
+    return dev
+
+
+def teardown_device(dev):
+    """Stop capture, workers and the scale; motor and lid off. (GPIO cleanup is separate.)"""
+    print("[EXIT] Cleaning up...")
+    try:
+        dev.grabber.stop()
+    except Exception:
+        pass
+    try:
+        dev.cap.release()
+    except Exception:
+        pass
+    try:
+        if dev.pool is not None:
+            dev.pool.close()
+    except Exception:
+        pass
+    try:
+        if dev.preview is not None:
+            dev.preview.stop()
+    except Exception:
+        pass
+    try:
+        dev.pwm.stop()
+    except Exception:
+        pass
+    try:
+        dev.baseline.flush()
+        dev.sampler.stop()
+    except Exception:
+        pass
+    try:
+        dev.motor.stop()
+    except Exception:
+        pass
+    try:
+        if dev.hx is not None:
+            dev.hx.power_down()
+    except Exception:
+        pass
+
+
+def setup_telemetry(send):
+    """
+    Rate limits / state-change filtering in front of the batching sender;
+    events that cannot be published wait in the on-disk outbox.
+    Returns (publisher, telemetry) and sets the global TELEMETRY.
+    """
+    global TELEMETRY
+    publisher = TelemetryPublisher(send, outbox=Outbox(OUTBOX_PATH, max_bytes=OUTBOX_MAX_BYTES),
+                                   id_prefix=AWS_CLIENT_ID).start()
+    TELEMETRY = TelemetryPolicy(publisher)
+    return publisher, TELEMETRY
+
+
+def detection_step(dev, frame, snap):
+    """Gating, detector (inline or pool) and tracker for one frame. Returns (species, boxes)."""
+    # Full inference only on motion + tracker keyframes, and only at presence
+    # rate while nothing could be dispensed; otherwise propagate tracks
+    dev.feed_gate.update(dev.sampler.latest_grams(default=None), snap,
+                         lambda sp: can_dispense(sp, snap))
+    wants_detection = dev.feed_gate.should_infer(dev.gate.should_infer(frame) and dev.tracker.needs_detection())
+    if dev.pool is not None:
+        if wants_detection:
+            submit_detection(dev.pool, frame, dev.roi)   # dropped when all workers are busy
+        results = collect_detections(dev.pool, dev.roi)
+        for dets in results:
+            dev.tracker.update(dets)
+        if not results:
+            dev.tracker.predict()
+    elif wants_detection:
+        dev.tracker.update(run_detector(dev.detector, frame, dev.roi))
+    else:
+        dev.tracker.predict()
+
+    species = dev.tracker.present_species(SPECIES_CLASS_IDS)
+    boxes = [t.as_tuple(SPECIES_CLASS_IDS) for t in dev.tracker.confirmed()]
+
+    # Annotation + JPEG encoding only happen while a preview client is connected
+    if dev.preview is not None:
+        dev.preview.offer(frame, lambda f: annotate(f, boxes, dev.roi))
+    return species, boxes
+
+
+def log_stats(dev, telemetry):
+    if time.monotonic() - dev.last_stats < CAMERA_STATS_EVERY_S:
+        return
+    print("[CAM]", dev.grabber.stats(reset_max=True))
+    print("[GATE]", dev.gate.stats())
+    print("[FEED]", dev.feed_gate.stats())
+    print("[TRACK]", dev.tracker.stats())
+    print("[SCHED]", dev.scheduler.stats())
+    print("[HX711]", dev.sampler.stats())
+    print("[INTAKE]", dev.intake.stats())
+    if dev.baseline.updates != dev.published_tare_updates:
+        publish_msg(telemetry, "scale_baseline", dev.baseline.telemetry())
+        dev.published_tare_updates = dev.baseline.updates
+    print("[TELEMETRY]", telemetry.stats(reset_max=True))
+    if dev.pool is not None:
+        print("[POOL]", dev.pool.stats())
+    dev.last_stats = time.monotonic()
+
+
+def handle_species(dev, species, boxes, frame_age_ms, telemetry, dispense, snap):
+    """
+    Start a dispense via dispense(species, snap), or track the cooldown state,
+    for the species at the bowl. `snap` is the frame's settings snapshot, the
+    same one the feed gate decided with.
+    """
+    # If your detector returns labels, map them → species names you use in SETTINGS
+    cooling = None
+    if species in ("cat", "dog") and not dev.dispensing:  # gate on your real logic
+        if species in dev.feed_gate.eligible and can_dispense(species, snap):
+            publish_msg(telemetry, "species_detected", {
+                "species": species,
+                "boxes": boxes,
+                "frame_age_ms": frame_age_ms,
+                "settings_version": snap.version,
+            })
+            dispense(species, snap)
+        elif dev.feed_gate.reasons.get(species, "cooldown") == "cooldown":
+            cooling = species
+
+    # cooldown_active on enter/exit (plus keyframes while it lasts), not per frame
+    for sp in ("cat", "dog"):
+        telemetry.state(("cooldown", sp), sp == cooling,
+                        lambda active, sp=sp: cooldown_msg(sp, active, snap))
+
+
+def after_frame(dev, species, telemetry):
+    # Track load-cell zero drift while nobody is at the bowl
+    dev.baseline.update(busy=bool(dev.tracker.tracks) or dev.dispensing)
+
+    # One summary per eating bout instead of raw weight samples
+    bout = dev.intake.update(species if species in ("cat", "dog") else None)
+    if bout is not None:
+        print(f"[INTAKE] {bout['species']} ate {bout['grams_consumed']} g in {bout['duration_s']} s")
+        publish_msg(telemetry, "consumption_bout", bout)
+
+    dev.scheduler.note_activity(pet_seen=bool(dev.tracker.tracks),
+                                motion=dev.gate.last_fraction >= MOTION_THRESHOLD)
+
+
+def ready_payload(dev):
+    snap = SETTINGS.get()
+    # Full reported state once per boot; the backend answers with a delta if desired differs
+    return {"settings": snap.as_dict(), "settings_version": snap.version,
+            "settings_source": SETTINGS.source, "scale": dev.baseline.telemetry()}
 
-    # print("[INIT] Model...")
-    # model = YOLO(MODEL_PATH)
+
+def main():
+    """The "threads" runtime: one blocking loop, AWS IoT SDK callbacks for settings."""
+    dev = setup_device()
 
     print("[AWS] Connecting...")
     aws_client = build_aws_client()
+    publisher, telemetry = setup_telemetry(lambda body: aws_client.publish(AWS_TOPIC, body, 1))
+    aws_client.onOnline = lambda: publisher.set_online(True)
+    aws_client.onOffline = lambda: publisher.set_online(False)
     aws_client.connect()
     print("[AWS] Connected.")
 
@@ -338,76 +714,147 @@ def main():
     print(f"[AWS] Subscribed to: {AWS_TOPIC_SUBSCRIBE}")
 
     # Announce ready + current defaults
-    with SETTINGS_LOCK:
-        publish_msg(aws_client, "device_ready", {"settings": SETTINGS})
+    publish_msg(telemetry, "device_ready", ready_payload(dev))
 
     signal.signal(signal.SIGINT, handle_sigint)
 
     print("[RUN] Press Ctrl+C to exit.")
     try:
         while RUNNING:
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.1)
+            frame, frame_ts = dev.grabber.read(timeout=1.0)
+            if frame is None:
                 continue
-
-            species, annotated = detect_species(frame)
-
-            # If your detector returns labels, map them → species names you use in SETTINGS
-            if species in ("cat", "dog"):  # gate on your real logic
-                if can_dispense(species):
-                    publish_msg(aws_client, "species_detected", {"species": species})
-                    dispense_to_target(hx_handle, pwm, species, aws_client)
-                else:
-                    with SETTINGS_LOCK:
-                        cd = SETTINGS[species]["cooldown"]
-                    since = time.time() - LAST_DISPENSE.get(species, 0.0)
-                    publish_msg(aws_client, "cooldown_active", {
-                        "species": species,
-                        "cooldown_s": cd,
-                        "elapsed_s": int(since)
-                    })
-
-            # Show preview (optional; comment out if headless)
-            try:
-                cv2.imshow("IoTreat", annotated)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    RUNNING = False
-            except Exception:
-                # Ignore headless / framebuffer issues safely
-                pass
-
-            time.sleep(SLEEP_BETWEEN_FRAMES)
+            loop_t0 = time.monotonic()
+            snap = SETTINGS.get()   # one settings version per frame: gate, cooldown, dispense
+
+            species, boxes = detection_step(dev, frame, snap)
+            frame_age_ms = int((time.monotonic() - frame_ts) * 1000)
+            log_stats(dev, telemetry)
+            handle_species(dev, species, boxes, frame_age_ms, telemetry,
+                           lambda sp, snap: dispense_to_target(dev.controller, dev.pwm, sp, telemetry, snap),
+                           snap)
+            after_frame(dev, species, telemetry)
+            dev.scheduler.sleep(time.monotonic() - loop_t0)
 
     except Exception as e:
         print("[ERROR] Unhandled exception:", e)
         traceback.print_exc()
     finally:
-        print("[EXIT] Cleaning up...")
+        teardown_device(dev)
         try:
-            cap.release()
+            telemetry.stop()
         except Exception:
             pass
         try:
-            cv2.destroyAllWindows()
-        except Exception:
-            pass
-        try:
-            pwm.stop()
-        except Exception:
-            pass
-        try:
-            if hx_handle is not None:
-                hx_handle.power_down()
+            aws_client.disconnect()
         except Exception:
             pass
+        gpio_cleanup()
+        print("[EXIT] Done.")
+
+
+# =========================
+# asyncio runtime
+# =========================
+async def vision_task(dev, telemetry, dispense_q):
+    """Capture + inference on a dedicated executor thread; decisions on the event loop."""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(1, thread_name_prefix="vision")
+
+    def request_dispense(species, snap):
+        dev.dispensing = True      # no new requests until dispense_task is done with this one
+        dispense_q.put_nowait((species, snap))
+
+    try:
+        while True:
+            frame, frame_ts = await loop.run_in_executor(executor, dev.grabber.read, 1.0)
+            if frame is None:
+                continue
+            loop_t0 = time.monotonic()
+            snap = SETTINGS.get()   # one settings version per frame: gate, cooldown, dispense
+
+            species, boxes = await loop.run_in_executor(executor, detection_step, dev, frame, snap)
+            frame_age_ms = int((time.monotonic() - frame_ts) * 1000)
+            log_stats(dev, telemetry)
+            handle_species(dev, species, boxes, frame_age_ms, telemetry, request_dispense, snap)
+            after_frame(dev, species, telemetry)
+            await asyncio.sleep(max(0.0, dev.scheduler.next_interval() - (time.monotonic() - loop_t0)))
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def dispense_task(dev, telemetry, dispense_q):
+    executor = ThreadPoolExecutor(1, thread_name_prefix="dispense")
+    try:
+        while True:
+            species, snap = await dispense_q.get()
+            try:
+                await dispense_async(dev, species, telemetry, executor, snap)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("[DISPENSE] Error:", e)
+                traceback.print_exc()
+            finally:
+                dev.dispensing = False
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def async_main():
+    """The "asyncio" runtime: vision, dispensing and MQTT as cooperating tasks."""
+    # aiomqtt: only needed by this runtime
+    from mqtt_async import AsyncMqttLink
+
+    # Built before any hardware is touched: raises right away if aiomqtt is missing
+    link = AsyncMqttLink(MQTT_HOST, MQTT_PORT, AWS_CLIENT_ID,
+                         tls=(AWS_ROOT_CA, AWS_CERT, AWS_PRIVATE_KEY) if MQTT_TLS else None,
+                         subscriptions={AWS_TOPIC_SUBSCRIBE: apply_settings_payload},
+                         on_online=lambda: publisher.set_online(True),
+                         on_offline=lambda: publisher.set_online(False))
+
+    dev = setup_device()
+    publisher, telemetry = setup_telemetry(lambda body: link.publish_threadsafe(AWS_TOPIC, body, 1))
+    publisher.set_online(False)    # until the link is up; events wait in the outbox
+
+    publish_msg(telemetry, "device_ready", ready_payload(dev))
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    dispense_q = asyncio.Queue(maxsize=1)
+    mqtt = asyncio.create_task(link.run(), name="mqtt")
+    workers = [asyncio.create_task(vision_task(dev, telemetry, dispense_q), name="vision"),
+               asyncio.create_task(dispense_task(dev, telemetry, dispense_q), name="dispense")]
+    stopper = asyncio.create_task(stop.wait(), name="stop")
+
+    print(f"[RUN] asyncio runtime, MQTT {MQTT_HOST}:{MQTT_PORT}. Press Ctrl+C to exit.")
+    try:
+        done, _ = await asyncio.wait(workers + [mqtt, stopper], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not stopper and task.exception() is not None:
+                print(f"[ERROR] Task {task.get_name()} failed:", task.exception())
+                traceback.print_exception(task.exception())
+    finally:
+        # Workers first (aborts a running dispense), then flush telemetry while MQTT is still up
+        for task in workers + [stopper]:
+            task.cancel()
+        await asyncio.gather(*workers, stopper, return_exceptions=True)
+        teardown_device(dev)
         try:
-            aws_client.disconnect()
+            await loop.run_in_executor(None, telemetry.stop)
         except Exception:
             pass
+        mqtt.cancel()
+        await asyncio.gather(mqtt, return_exceptions=True)
         gpio_cleanup()
         print("[EXIT] Done.")
 
 
 if __name__ == "__main__":
-    main()
+    if RUNTIME == "asyncio":
+        asyncio.run(async_main())
+    else:
+        main()
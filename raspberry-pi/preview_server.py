@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Headless MJPEG preview for the feeder camera.
+
+Replaces per-frame cv2.imshow / cv2.waitKey. The detection loop calls
+offer(frame, render) every frame, but annotation and JPEG encoding only
+happen while at least one client is connected, and at most max_fps times
+per second. Open http://<pi>:<port>/ in a browser to watch.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "iotreatframe"
+
+INDEX_HTML = b"""<!doctype html>
+<html><head><title>IoTreat preview</title></head>
+<body style="margin:0;background:#111">
+<img src="/stream" style="display:block;margin:auto;max-width:100%">
+</body></html>
+"""
+
+
+class PreviewServer:
+    def __init__(self, port=8080, host="0.0.0.0", max_fps=5.0, quality=70):
+        self.host = host
+        self.port = port
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.quality = quality
+
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._clients = 0
+        self._last_encode = 0.0
+        self._server = None
+        self._thread = None
+        self._running = False
+
+        self.encoded = 0
+
+    @property
+    def has_clients(self):
+        return self._clients > 0
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass  # keep the console for the feeder logs
+
+            def do_GET(self):
+                if self.path in ("/", "/index.html"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(INDEX_HTML)))
+                    self.end_headers()
+                    self.wfile.write(INDEX_HTML)
+                elif self.path == "/stream":
+                    server._serve_stream(self)
+                else:
+                    self.send_error(404)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._running = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="PreviewServer", daemon=True)
+        self._thread.start()
+        print(f"[PREVIEW] MJPEG preview on http://{self.host}:{self.port}/")
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def offer(self, frame, render=None):
+        """
+        Hand the latest frame to the server. `render(frame) -> frame` (e.g.
+        drawing boxes) is only called when the frame will actually be sent.
+        """
+        if not self._clients:
+            return
+        now = time.monotonic()
+        if now - self._last_encode < self.min_interval:
+            return
+        self._last_encode = now
+
+        img = render(frame) if render is not None else frame
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = buf.tobytes()
+            self._seq += 1
+            self._cond.notify_all()
+        self.encoded += 1
+
+    def _serve_stream(self, handler):
+        handler.send_response(200)
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        handler.end_headers()
+
+        with self._cond:
+            self._clients += 1
+        seen = -1
+        try:
+            while self._running:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != seen or not self._running, timeout=5.0)
+                    if not self._running:
+                        break
+                    if self._seq == seen:
+                        continue
+                    jpeg, seen = self._jpeg, self._seq
+                handler.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                )
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def stats(self):
+        return {"clients": self._clients, "encoded": self.encoded}
@@ -19,6 +19,13 @@ import cv2
 from ultralytics import YOLO
 from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 
+from frame_grabber import FrameGrabber
+from motion_gate import MotionGate
+from detections import from_results, class_names
+from preview_server import PreviewServer
+from hx711_sampler import HX711Sampler
+from calibration import calibration_path, load_calibration
+
 # ----------------------------
 # CONFIG
 # ----------------------------
@@ -49,14 +56,15 @@ PULSE_OPEN   = 2000    # µs (adjust)
 DT_PIN = 5
 SCK_PIN = 6
 
-# Calibration — set these AFTER you calibrate
+# Calibration — written by calibration.py; these are only the fallback
 HX_OFFSET = -131480      # raw no-load
 HX_SCALE = 1563.7        # counts per gram
+CALIBRATION_PATH = calibration_path("/home/cloudy7/iotreat", "IOTreat", "bowl")
 
 # Dispensing control
 TARGET_GRAMS = 50.0      # how much food to dispense for this detection (change to desired)
 MAX_DISPENSE_TIME = 30   # seconds - safety timeout in case dispensing fails
-READ_SAMPLES = 3         # how many get_raw_data() samples to sample per reading
+WEIGHT_POLL = 0.02       # seconds between weight checks (sampler runs in the background)
 
 # AWS IoT (update endpoints and certificate file paths)
 AWS_CLIENT_ID = "IOTreat"
@@ -67,6 +75,14 @@ AWS_PRIVATE_KEY = "/home/cloudy7/Downloads/private.pem.key"
 AWS_CERT = "/home/cloudy7/Downloads/device-certificate.pem.crt"
 AWS_TOPIC = "iotreat/test"
 
+# Motion gate (skip YOLO while the scene is static)
+MOTION_THRESHOLD = 0.02      # fraction of changed pixels that wakes the detector
+MOTION_HEARTBEAT_S = 10.0    # run YOLO at least this often anyway
+
+# Remote preview (MJPEG over HTTP, http://<pi>:PREVIEW_PORT/); off by default
+PREVIEW_ENABLED = False
+PREVIEW_PORT = 8080
+
 # Misc
 SLEEP_BETWEEN_FRAMES = 0.05
 
@@ -84,38 +100,6 @@ def publish_msg(client, text, extra=None):
     client.publish(AWS_TOPIC, json.dumps(payload), 1)
     print("[AWS] Published:", payload)
 
-def get_single_raw(hx):
-    """
-    Ask the hx711 lib for raw data. Some libs return a list of samples,
-    some return ints. Handle both.
-    """
-    raw = hx.get_raw_data()
-    # hx.get_raw_data() may return None, int, or list
-    if raw is None:
-        return None
-    if isinstance(raw, list):
-        if len(raw) == 0:
-            return None
-        return raw[0]
-    return int(raw)
-
-def read_weight_grams(hx, samples=READ_SAMPLES, delay=0.02):
-    """Return average grams from `samples` raw readings (or None)."""
-    raws = []
-    for _ in range(samples):
-        r = get_single_raw(hx)
-        if r is None:
-            # skip this sample but continue trying others
-            time.sleep(delay)
-            continue
-        raws.append(r)
-        time.sleep(delay)
-    if not raws:
-        return None
-    avg_raw = sum(raws) / len(raws)
-    grams = (avg_raw - HX_OFFSET) / HX_SCALE
-    return grams, avg_raw
-
 # ----------------------------
 # Setup hardware
 # ----------------------------
@@ -145,6 +129,11 @@ hx.reset()
 hx.power_up()
 time.sleep(0.1)
 
+# Sample the load cell continuously on its own thread
+cal = load_calibration(CALIBRATION_PATH, HX_OFFSET, HX_SCALE)
+print(f"[HX711] Calibration rev {cal.revision} ({cal.source})")
+sampler = HX711Sampler(hx, cal.offset, cal.scale).start()
+
 # YOLO model
 print("[YOLO] Loading model...")
 model = YOLO(YOLO_MODEL)
@@ -162,6 +151,12 @@ cap = cv2.VideoCapture(CAMERA_ID)
 if not cap.isOpened():
     print("[ERROR] Could not open camera.")
     sys.exit(1)
+cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+# Capture runs on its own thread; the loop below always gets the newest frame
+grabber = FrameGrabber(cap).start()
+gate = MotionGate(threshold=MOTION_THRESHOLD, heartbeat_s=MOTION_HEARTBEAT_S)
+preview = PreviewServer(PREVIEW_PORT).start() if PREVIEW_ENABLED else None
 
 # Track last triggered time per species
 last_trigger = {name: 0 for name in COOLDOWNS.keys()}
@@ -173,28 +168,23 @@ print("[INFO] Starting detection loop. Press Ctrl+C to stop.")
 # ----------------------------
 try:
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("[ERROR] Failed to read frame.")
-            time.sleep(0.2)
+        frame, frame_ts = grabber.read(timeout=1.0)
+        if frame is None:
+            print("[ERROR] No new frame from camera.", grabber.stats())
             continue
 
-        # YOLO inference
-        results = model(frame, verbose=False)
+        # YOLO inference (only when the motion gate says something changed)
+        if gate.should_infer(frame):
+            results = model(frame, verbose=False)
+        else:
+            results = []
 
-        # find allowed detections
-        detections = []
-        for r in results:
-            if not hasattr(r, "boxes") or r.boxes is None:
-                continue
-            for box in r.boxes:
-                cls_id = int(box.cls[0]) if hasattr(box.cls, "__len__") else int(box.cls)
-                if cls_id in ALLOWED_CLASS_IDS:
-                    detections.append(ALLOWED_CLASS_IDS[cls_id])
+        # find allowed detections (vectorized; one structured array per frame)
+        dets = from_results(results, ALLOWED_CLASS_IDS)
 
-        if detections:
+        if len(dets):
             # If multiple classes found, we will process each unique class separately.
-            unique = list(dict.fromkeys(detections))  # preserve order but unique
+            unique = class_names(dets, ALLOWED_CLASS_IDS)  # most confident first
             now = time.time()
             for species in unique:
                 cooldown = COOLDOWNS.get(species, 60)
@@ -219,20 +209,20 @@ try:
                 start_dispense = time.time()
                 finished = False
                 while time.time() - start_dispense <= MAX_DISPENSE_TIME:
-                    read = read_weight_grams(hx, samples=READ_SAMPLES)
+                    read = sampler.latest()
                     if read is None:
                         print("[HX711] No reading yet... waiting")
                         time.sleep(0.2)
                         continue
-                    grams, rawavg = read
-                    print(f"[HX711] avg_raw={rawavg:.0f}  grams={grams:.2f}")
+                    _, grams, raw = read
+                    print(f"[HX711] raw={raw:.0f}  grams={grams:.2f}")
 
                     if grams >= TARGET_GRAMS:
                         finished = True
                         break
 
-                    # else keep dispensing, sleep small interval
-                    time.sleep(0.2)
+                    # else keep dispensing; the sampler never blocks, so poll briskly
+                    time.sleep(WEIGHT_POLL)
 
                 if finished:
                     publish_msg(aws_client, f"{species} - finished dispensing, cooldown started", {"species": species, "stage": "finished", "grams": round(grams,2)})
@@ -246,11 +236,12 @@ try:
                 close_lid()
                 last_trigger[species] = time.time()
                 print(f"[DEBUG] {species} cooldown set for {cooldown} seconds.\n")
+                print("[CAM]", grabber.stats(reset_max=True))
+                print("[GATE]", gate.stats())
 
-        # optional: show frame
-        cv2.imshow("Camera", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        # optional: remote preview (encodes only while someone is watching)
+        if preview is not None:
+            preview.offer(frame)
 
         time.sleep(SLEEP_BETWEEN_FRAMES)
 
@@ -272,12 +263,15 @@ finally:
     except:
         pass
     try:
+        sampler.stop()
         hx.power_down()
     except:
         pass
     try:
+        grabber.stop()
         cap.release()
-        cv2.destroyAllWindows()
+        if preview is not None:
+            preview.stop()
     except:
         pass
     try:
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Copy-on-write, versioned feeder settings.
+
+Readers (vision loop, dispenser, feed gate) take the current snapshot with a
+plain attribute read -- no lock -- and keep using that one object for a
+whole decision, so a concurrent update can never give them half-old,
+half-new values. Writers (MQTT settings callback) validate the change, build
+a complete new snapshot and swap the reference; only writers serialize among
+themselves. Every snapshot carries a version that decisions report.
+
+Sync with the cloud (reported/desired split):
+  - desired: the backend sends delta documents against the version it last
+    saw -- {"base_version": 7, "delta": {"cat": {"grams": 40}}}. update()
+    applies them compare-and-set: a stale base_version raises VersionConflict
+    instead of silently overwriting newer settings
+  - reported: the device answers with the new version and only the fields
+    that actually changed (diff())
+  - the applied settings are cached on disk (path), so after a reboot the
+    device starts with its last-known portions and cooldowns at once
+"""
+
+import threading
+import time
+from types import MappingProxyType
+
+from state_files import load_json, save_json_atomic
+
+
+def _freeze(settings):
+    return MappingProxyType({sp: MappingProxyType(dict(cfg)) for sp, cfg in settings.items()})
+
+
+def validate_fields(fields):
+    """Clean per-species fields: cooldown (s, int >= 0), grams (>= 0), hours ([start, end] or None)."""
+    clean = {}
+    if "cooldown" in fields:
+        try:
+            cd = int(fields["cooldown"])
+            if cd >= 0:
+                clean["cooldown"] = cd
+        except (TypeError, ValueError):
+            pass
+    if "grams" in fields:
+        try:
+            g = float(fields["grams"])
+            if g >= 0:
+                clean["grams"] = g
+        except (TypeError, ValueError):
+            pass
+    if "hours" in fields:
+        hours = fields["hours"]
+        if hours is None:
+            clean["hours"] = None
+        else:
+            try:
+                start, end = (float(h) for h in hours)
+                if 0 <= start <= 24 and 0 <= end <= 24:
+                    clean["hours"] = [start, end]
+            except (TypeError, ValueError):
+                pass
+    return clean
+
+
+def diff(old, new):
+    """Delta {species: {key: value}} from snapshot old to new; removed keys map to None."""
+    delta = {}
+    for sp, cfg in new.species.items():
+        prev = old.species.get(sp, {})
+        changed = {k: v for k, v in cfg.items() if prev.get(k) != v}
+        changed.update({k: None for k in prev if k not in cfg})
+        if changed:
+            delta[sp] = changed
+    return delta
+
+
+class VersionConflict(Exception):
+    """A delta was based on another version than the current one (compare-and-set failed)."""
+
+    def __init__(self, base_version, current):
+        super().__init__(f"delta based on version {base_version}, settings are at {current}")
+        self.base_version = base_version
+        self.current = current
+
+
+class SettingsSnapshot:
+    """Immutable settings: `species` maps species -> read-only config mapping."""
+
+    __slots__ = ("version", "species")
+
+    def __init__(self, version, species):
+        self.version = version
+        self.species = species
+
+    def get(self, species, key, default=None):
+        return self.species.get(species, {}).get(key, default)
+
+    def as_dict(self):
+        """Plain (JSON-serializable) copy."""
+        return {sp: dict(cfg) for sp, cfg in self.species.items()}
+
+
+class SettingsStore:
+    """
+    defaults  {species: fields}; defines the known species
+    version   version of the defaults (used when there is no cache)
+    path      JSON cache of the last applied settings (None = no persistence)
+    """
+
+    def __init__(self, defaults, version=1, path=None):
+        self.path = path
+        self.source = "defaults"
+        settings = {sp: dict(cfg) for sp, cfg in defaults.items()}
+        cached = load_json(path) if path else None
+        if isinstance(cached, dict) and isinstance(cached.get("settings"), dict) \
+                and isinstance(cached.get("version"), int):
+            self._merge(settings, cached["settings"])
+            version = cached["version"]
+            self.source = "cache"
+        self._snapshot = SettingsSnapshot(version, _freeze(settings))
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _merge(settings, changes):
+        """Apply validated {species: fields} onto a plain settings dict (known species only)."""
+        for sp, fields in changes.items():
+            sp = str(sp).lower()
+            if sp not in settings or not isinstance(fields, dict):
+                continue
+            for key, value in validate_fields(fields).items():
+                if value is None:
+                    settings[sp].pop(key, None)
+                else:
+                    settings[sp][key] = value
+
+    def get(self):
+        """Current snapshot (lock-free; hold on to it for the duration of a decision)."""
+        return self._snapshot
+
+    def update(self, changes, base_version=None):
+        """
+        Apply {species: fields} (unknown species are ignored, fields validated).
+        With base_version, only if it is the current version (else VersionConflict).
+        Returns (snapshot, delta); a new version is published, and cached on
+        disk, only if something actually changed.
+        """
+        with self._write_lock:
+            cur = self._snapshot
+            if base_version is not None and base_version != cur.version:
+                raise VersionConflict(base_version, cur.version)
+            new = cur.as_dict()
+            self._merge(new, changes)
+            snap = SettingsSnapshot(cur.version + 1, _freeze(new))
+            delta = diff(cur, snap)
+            if not delta:
+                return cur, delta
+            self._snapshot = snap
+            self._save(snap)
+            return snap, delta
+
+    def _save(self, snap):
+        if not self.path:
+            return
+        try:
+            save_json_atomic(self.path, {"version": snap.version, "settings": snap.as_dict(),
+                                         "saved": time.time()})
+        except OSError as e:
+            print("[SETTINGS] Could not cache settings:", e)
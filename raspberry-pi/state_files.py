@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Small helpers for the per-device state files kept under STATE_DIR
+(learned dispenser lag, load-cell zero, calibration, cached settings, ...).
+"""
+
+import json
+import os
+
+
+def save_json_atomic(path, data):
+    """Write JSON via a temp file + rename so a power cut never leaves half a file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_json(path, default=None):
+    """Parsed JSON from `path`, or `default` if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
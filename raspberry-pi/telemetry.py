@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Non-blocking telemetry publisher.
+
+The control loops only enqueue event dicts; a background thread encodes them
+and hands them to the MQTT client, so a slow broker ACK never stretches a
+dispense or a detection frame.
+
+Batching: the sender waits up to batch_window_s after the first queued event
+(or until batch_max events / batch_max_bytes) and publishes them together:
+
+    1 event   -> the event itself (unchanged wire format)
+    n events  -> {"event": "batch", "ts": ..., "events": [event, ...]}
+
+Overflow: the queue is bounded. When it is full, the oldest low-priority event
+(progress, cooldown notices) is dropped to make room; if there is none, a
+low-priority newcomer is dropped and a high-priority one evicts the oldest
+event. Events are always sent in enqueue order.
+
+Offline: with an Outbox attached, batches that cannot be published go to disk.
+Once the client is back online, live events are sent straight away and the
+backlog drains behind them: compacted first (superseded progress events
+dropped), high-value events first, at a rate that ramps up from
+drain_min_rate while ACKs stay under drain_target_ms and backs off when they
+don't. Every event gets a msg_id ("<prefix>-<boot>-<seq>") and keeps its
+original ts, so the dashboard can de-duplicate and re-order replays.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+LOW_PRIORITY_EVENTS = frozenset({"dispense_progress", "cooldown_active"})
+HIGH_VALUE_EVENTS = frozenset({"dispense_done", "dispense_timeout", "dispense_aborted",
+                               "skip_dispense", "settings_reported", "settings_rejected",
+                               "consumption_bout", "device_ready"})
+
+
+class TelemetryPublisher:
+    """
+    send             callable(body: str); blocking publish (e.g. MQTT qos=1)
+    max_queue        queued events across both priorities
+    batch_max        events per MQTT message
+    batch_max_bytes  approximate payload cap per MQTT message
+    batch_window_s   how long to wait for more events after the first one
+    low_priority     event names that are dropped first when the queue is full
+    outbox           optional Outbox for events that could not be published
+    id_prefix        prefix of the per-event msg_id (device id)
+    high_value       event names replayed first from the outbox
+    retry_s          after a failed publish, wait this long before replaying
+    drain_min_rate   replayed batches per second right after reconnecting...
+    drain_max_rate   ...ramping up to this ceiling
+    drain_target_ms  ramp up while publish ACKs stay below this, back off above
+    """
+
+    def __init__(self, send, max_queue=512, batch_max=16, batch_max_bytes=32_000,
+                 batch_window_s=0.25, low_priority=LOW_PRIORITY_EVENTS,
+                 outbox=None, id_prefix="dev", high_value=HIGH_VALUE_EVENTS, retry_s=5.0,
+                 drain_min_rate=2.0, drain_max_rate=20.0, drain_target_ms=300.0):
+        self.send = send
+        self.max_queue = max_queue
+        self.batch_max = batch_max
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_window_s = batch_window_s
+        self.low_priority = frozenset(low_priority)
+        self.outbox = outbox
+        self.high_value = frozenset(high_value)
+        self.retry_s = retry_s
+        self.drain_min_rate = drain_min_rate
+        self.drain_max_rate = drain_max_rate
+        self.drain_target_ms = drain_target_ms
+        self.drain_rate = drain_min_rate
+        self._compact_due = True
+        self._id_base = f"{id_prefix}-{int(time.time()):x}"
+        self.online = True
+        self._next_drain = 0.0
+        self._kick = False
+
+        self._high = deque()     # (seq, t_enqueue, msg)
+        self._low = deque()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+        self.send_errors = 0
+        self.deferred = 0
+        self.max_depth = 0
+        self.last_send_ms = 0.0
+        self.max_send_ms = 0.0
+        self.avg_send_ms = 0.0
+        self.max_queue_ms = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TelemetryPublisher", daemon=True)
+        self._thread.start()
+        return self
+
+    # ----- producer side (any thread) -----
+    def publish(self, msg):
+        """Enqueue one event dict (must contain "event"). Never blocks on the network."""
+        low = msg.get("event") in self.low_priority
+        with self._cond:
+            if len(self._high) + len(self._low) >= self.max_queue:
+                if self._low:
+                    self._low.popleft()
+                elif low:
+                    self.dropped += 1
+                    return False
+                else:
+                    self._high.popleft()
+                self.dropped += 1
+            self._seq += 1
+            (self._low if low else self._high).append((self._seq, time.monotonic(), msg))
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._high) + len(self._low))
+            self._cond.notify()
+        return True
+
+    def set_online(self, online):
+        """Connection state hook (MQTT client onOnline / onOffline)."""
+        with self._cond:
+            self.online = online
+            if online:
+                self._next_drain = 0.0
+            self._kick = True
+            self._cond.notify()
+
+    def depth(self):
+        with self._cond:
+            return len(self._high) + len(self._low)
+
+    # ----- sender thread -----
+    def _pop_oldest(self):
+        if self._high and (not self._low or self._high[0][0] < self._low[0][0]):
+            return self._high.popleft()
+        return self._low.popleft()
+
+    def _collect(self, wait_s=None):
+        """Wait (up to wait_s) for the first event, then gather a batch. Returns [(t_enqueue, event, body)]."""
+        with self._cond:
+            if self._running and not (self._high or self._low):
+                self._cond.wait_for(lambda: not self._running or self._kick or self._high or self._low, wait_s)
+            self._kick = False
+            if not (self._high or self._low):
+                return []
+            deadline = time.monotonic() + self.batch_window_s
+            while (self._running and len(self._high) + len(self._low) < self.batch_max
+                   and time.monotonic() < deadline):
+                self._cond.wait(deadline - time.monotonic())
+
+            batch, size = [], 0
+            while (self._high or self._low) and len(batch) < self.batch_max:
+                seq, t_enq, msg = self._pop_oldest()
+                body = json.dumps({"msg_id": f"{self._id_base}-{seq}", **msg}, separators=(",", ":"))
+                batch.append((t_enq, msg.get("event"), body))
+                size += len(body)
+                if size >= self.batch_max_bytes:
+                    break
+            return batch
+
+    def _send(self, bodies, t_enq=None):
+        """Publish encoded events as one message. Returns False if the publish failed."""
+        if len(bodies) == 1:
+            body = bodies[0]
+        else:
+            body = '{"event":"batch","ts":%d,"events":[%s]}' % (int(time.time() * 1000), ",".join(bodies))
+        t0 = time.monotonic()
+        try:
+            self.send(body)
+        except Exception as e:
+            self.send_errors += 1
+            print("[TELEMETRY] Publish error:", e)
+            return False
+        now = time.monotonic()
+        self.last_send_ms = (now - t0) * 1000.0
+        self.max_send_ms = max(self.max_send_ms, self.last_send_ms)
+        self.avg_send_ms += 0.1 * (self.last_send_ms - self.avg_send_ms)
+        if t_enq is not None:
+            self.max_queue_ms = max(self.max_queue_ms, (now - t_enq) * 1000.0)
+        self.sent += len(bodies)
+        self.batches += 1
+        return True
+
+    def _priority(self, event):
+        if event in self.high_value:
+            return 2
+        return 0 if event in self.low_priority else 1
+
+    def _deliver(self, batch):
+        bodies = [b for _, _, b in batch]
+        if self.outbox is None:
+            self._send(bodies, batch[0][0])
+            return
+        # Live events go first; only what cannot be published waits on disk
+        if self.online and self._send(bodies, batch[0][0]):
+            return
+        self._next_drain = time.monotonic() + self.retry_s
+        self.drain_rate = self.drain_min_rate
+        self._compact_due = True
+        self.outbox.append([(ev, self._priority(ev), b) for _, ev, b in batch])
+        self.deferred += len(bodies)
+
+    def _drain_one(self):
+        """Replay one outbox batch and adapt the drain rate to the ACK latency."""
+        if self._compact_due:
+            self.outbox.compact()
+            self._compact_due = False
+            if not len(self.outbox):
+                return
+        rows = self.outbox.peek(self.batch_max)
+        now = time.monotonic()
+        if not self._send([body for _, body in rows]):
+            self.drain_rate = self.drain_min_rate
+            self._next_drain = now + self.retry_s
+            return
+        self.outbox.ack(rows)
+        if self.last_send_ms <= self.drain_target_ms:
+            self.drain_rate = min(self.drain_max_rate, self.drain_rate * 1.5)
+        else:
+            self.drain_rate = max(self.drain_min_rate, self.drain_rate * 0.5)
+        self._next_drain = now + 1.0 / self.drain_rate
+
+    def _run(self):
+        while True:
+            wait_s = None
+            if self.outbox is not None and len(self.outbox):
+                wait_s = max(0.0, self._next_drain - time.monotonic())
+                if self.online and wait_s == 0.0 and self._running:
+                    self._drain_one()
+                    continue
+                if not self.online:
+                    wait_s = self.retry_s
+            if self.outbox is not None:
+                # Commit on a timer, not only when the next event happens to arrive
+                self.outbox.maybe_commit()
+                if self.outbox.pending:
+                    commit_s = self.outbox.commit_every_s
+                    wait_s = commit_s if wait_s is None else min(wait_s, commit_s)
+            batch = self._collect(wait_s)
+            if batch:
+                self._deliver(batch)
+            elif not self._running:
+                if self.outbox is not None:
+                    self.outbox.flush()
+                return
+
+    def stop(self, flush_timeout=2.0):
+        """Stop the sender; events still queued get flush_timeout seconds to go out."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(flush_timeout)
+        if self.outbox is not None and not (self._thread and self._thread.is_alive()):
+            self.outbox.close()
+
+    def stats(self, reset_max=False):
+        s = {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "send_errors": self.send_errors,
+            "deferred": self.deferred,
+            "avg_send_ms": round(self.avg_send_ms, 1),
+            "max_send_ms": round(self.max_send_ms, 1),
+            "max_queue_ms": round(self.max_queue_ms, 1),
+        }
+        if self.outbox is not None:
+            s["outbox"] = self.outbox.stats()
+            s["drain_rate"] = round(self.drain_rate, 1)
+        if reset_max:
+            self.max_depth = 0
+            self.max_send_ms = 0.0
+            self.max_queue_ms = 0.0
+        return s
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Telemetry policy: decides which events are worth sending.
+
+Sits in front of TelemetryPublisher with the same publish(msg) interface:
+  - per-event token buckets (rate, burst); events over their budget are
+    counted and dropped
+  - state(): state-change-only emission -- a keyed state (e.g. "cat in
+    cooldown") is published when it changes, plus a periodic keyframe while
+    it stays active, instead of once per frame
+"""
+
+import threading
+import time
+
+# event -> (events per second, burst). Events not listed are not limited.
+DEFAULT_LIMITS = {
+    "dispense_progress": (1.0, 1),
+    "species_detected": (0.2, 2),
+    "scale_baseline": (1 / 60.0, 1),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.t = time.monotonic()
+
+    def take(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class TelemetryPolicy:
+    """
+    sink        anything with publish(msg) (TelemetryPublisher)
+    limits      {event: (rate_per_s, burst)}, see DEFAULT_LIMITS
+    keyframe_s  re-publish an active state this often while it lasts
+    """
+
+    def __init__(self, sink, limits=None, keyframe_s=60.0):
+        self.sink = sink
+        self.keyframe_s = keyframe_s
+        self._buckets = {ev: TokenBucket(r, b) for ev, (r, b) in (limits or DEFAULT_LIMITS).items()}
+        self._states = {}           # key -> (value, last_emit)
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.limited = {}
+
+    def publish(self, msg):
+        """Rate-limit by event type, then hand over to the sink. Returns True if sent on."""
+        ev = msg.get("event")
+        with self._lock:
+            bucket = self._buckets.get(ev)
+            if bucket is not None and not bucket.take():
+                self.limited[ev] = self.limited.get(ev, 0) + 1
+                return False
+            self.passed += 1
+        return self.sink.publish(msg)
+
+    def state(self, key, value, build_msg, now=None):
+        """
+        Publish build_msg(value) when `value` for `key` changes, and every
+        keyframe_s while it is truthy. build_msg is only called when something
+        is sent, so per-frame calls are cheap. Bypasses the token buckets.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            prev = self._states.get(key)
+            changed = prev is None or prev[0] != value
+            if not changed and not (value and now - prev[1] >= self.keyframe_s):
+                return False
+            if prev is None and not value:
+                self._states[key] = (value, now)   # initial inactive state: nothing to report
+                return False
+            self._states[key] = (value, now)
+            self.passed += 1
+        return self.sink.publish(build_msg(value))
+
+    def stop(self, *args, **kwargs):
+        return self.sink.stop(*args, **kwargs)
+
+    def stats(self, reset_max=False):
+        s = self.sink.stats(reset_max=reset_max)
+        with self._lock:
+            s["policy_passed"] = self.passed
+            s["policy_limited"] = dict(self.limited)
+        return s
@@ -1,3 +1,5 @@
+import os
+import sys
 import cv2
 import time
 from ultralytics import YOLO
@@ -6,6 +8,11 @@ from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 import json
 import RPi.GPIO as GPIO
 
+# motion_gate.py lives one level up in raspberry-pi/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from motion_gate import MotionGate
+from detections import from_results, class_names
+
 # ============================================================
 #                MUTABLE SETTINGS (LIVE FROM AWS)
 # ============================================================
@@ -18,6 +25,9 @@ SETTINGS_LOCK = False     # (simple lock for safety)
 last_trigger = 0          # last dispense timestamp
 CAMERA_ID = 0
 
+MOTION_THRESHOLD = 0.02   # fraction of changed pixels that wakes YOLO
+MOTION_HEARTBEAT_S = 10.0 # run YOLO at least this often anyway
+
 # ============================================================
 #                SERVO SETUP
 # ============================================================
@@ -119,6 +129,8 @@ if not cap.isOpened():
 print("[INFO] Camera started.")
 print(f"[INFO] Cooldown = {SETTINGS['cooldown']} seconds\n")
 
+gate = MotionGate(threshold=MOTION_THRESHOLD, heartbeat_s=MOTION_HEARTBEAT_S)
+
 # ============================================================
 #                MAIN DETECTION LOOP
 # ============================================================
@@ -128,17 +140,15 @@ while True:
         print("[ERROR] Frame grab failed.")
         break
 
-    results = model(frame, verbose=False)
-
-    detected = False
-    detected_classes = []
+    # Skip YOLO while nothing moves in front of the feeder
+    if gate.should_infer(frame):
+        results = model(frame, verbose=False)
+    else:
+        results = []
 
-    for r in results:
-        for box in r.boxes:
-            cls_id = int(box.cls[0])
-            if cls_id in [0, 15, 16]:  # person, cat, dog
-                detected = True
-                detected_classes.append(model.names[cls_id])
+    dets = from_results(results, (0, 15, 16))  # person, cat, dog
+    detected = len(dets) > 0
+    detected_classes = class_names(dets, model.names)
 
     now = time.time()
 
@@ -174,5 +184,6 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
+print("[GATE]", gate.stats())
 cap.release()
 cv2.destroyAllWindows()
@@ -12,6 +12,7 @@ Also ensure pigpiod is running:
   sudo systemctl start pigpiod
 """
 
+import os
 import time
 import threading
 import sys
@@ -21,6 +22,10 @@ import cv2
 # YOLO (ultralytics)
 from ultralytics import YOLO
 
+# shared helpers live one level up in raspberry-pi/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detections import from_results, summary
+
 # pigpio for servo
 import pigpio
 
@@ -135,6 +140,7 @@ def main():
     # load YOLO model
     print("[DEBUG] Loading YOLO model:", YOLO_MODEL)
     model = YOLO(YOLO_MODEL)  # this may download weights if needed
+    detect_ids = {i for i, n in model.names.items() if n in DETECT_CLASSES}
     print("[DEBUG] YOLO model loaded")
 
     # open camera
@@ -160,26 +166,12 @@ def main():
 
             # run YOLO inference (returns results list)
             results = model.predict(img, imgsz=640, conf=CONFIDENCE_THRESHOLD, verbose=False)
-            detections = results[0]  # ultralytics returns list of results; take first for single image
-            boxes = detections.boxes  # Boxes object (xyxy, confidence, cls)
-
-            detected_interesting = False
-            detected_items = []
-
-            if boxes is not None and len(boxes) > 0:
-                for i, box in enumerate(boxes):
-                    conf = float(box.conf[0]) if hasattr(box.conf, "__len__") else float(box.conf)
-                    cls_id = int(box.cls[0]) if hasattr(box.cls, "__len__") else int(box.cls)
-                    name = model.names.get(cls_id, str(cls_id))
-                    # debug line for each detection
-                    print(f"[DEBUG] Detected class={name}, conf={conf:.2f}")
-
-                    if name in DETECT_CLASSES and conf >= CONFIDENCE_THRESHOLD:
-                        detected_interesting = True
-                        detected_items.append((name, conf, box.xyxy[0].tolist()))
+            # all boxes in one pass: class + confidence filter via NumPy masks
+            dets = from_results(results, detect_ids, CONFIDENCE_THRESHOLD)
+            detected_interesting = len(dets) > 0
 
             if detected_interesting:
-                print("[INFO] Target detected:", detected_items)
+                print("[INFO] Target detected:", summary(dets, model.names))
                 # open lid
                 servo.open_lid()
                 time.sleep(SERVO_MOVE_DELAY)
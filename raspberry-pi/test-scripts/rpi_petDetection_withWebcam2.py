@@ -10,6 +10,7 @@ Requirements:
   pip install RPi.GPIO ultralytics opencv-python-headless numpy hx711
 """
 
+import os
 import time
 import sys
 import numpy as np
@@ -17,6 +18,10 @@ import cv2
 
 from ultralytics import YOLO
 
+# shared helpers live one level up in raspberry-pi/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detections import from_results, summary
+
 # ---- HX711 ----
 try:
     from hx711 import HX711
@@ -149,6 +154,7 @@ def main():
     print("[DEBUG] Loading YOLO model:", YOLO_MODEL)
     model = YOLO(YOLO_MODEL)
     print("[DEBUG] YOLO loaded")
+    detect_ids = {i for i, n in model.names.items() if n in DETECT_CLASSES}
 
     # Camera
     cap = cv2.VideoCapture(VIDEO_DEVICE_INDEX)
@@ -168,24 +174,10 @@ def main():
 
             img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             results = model.predict(img, imgsz=640, conf=CONFIDENCE_THRESHOLD, verbose=False)
-            det = results[0]
-            boxes = det.boxes
-
-            detected = False
-            items = []
-
-            if boxes is not None and len(boxes) > 0:
-                for box in boxes:
-                    conf = float(box.conf[0]) if hasattr(box.conf, "__len__") else float(box.conf)
-                    cls_id = int(box.cls[0]) if hasattr(box.cls, "__len__") else int(box.cls)
-                    name = model.names.get(cls_id, str(cls_id))
-                    print(f"[DEBUG] Detected class={name}, conf={conf:.2f}")
-                    if name in DETECT_CLASSES and conf >= CONFIDENCE_THRESHOLD:
-                        detected = True
-                        items.append((name, conf))
-
-            if detected:
-                print("[INFO] Target detected:", items)
+            dets = from_results(results, detect_ids, CONFIDENCE_THRESHOLD)
+
+            if len(dets):
+                print("[INFO] Target detected:", summary(dets, model.names))
                 # Open lid
                 servo.open_lid()
                 time.sleep(SERVO_MOVE_DELAY)
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
+import os
+import sys
 import time
 import RPi.GPIO as GPIO
 from hx711 import HX711
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from calibration import calibration_path, load_calibration
+
 GPIO.cleanup()
 # ------------------------------
 # PIN setup
@@ -10,10 +16,13 @@ DT_PIN = 5       # HX711 DOUT pin
 SCK_PIN = 6      # HX711 SCK pin
 
 # ------------------------------
-# Calibration values (UPDATE THESE)
+# Calibration values (run ../calibration.py to update)
 # ------------------------------
-OFFSET = -131480     # No-load raw reading
-SCALE = 1563.7        # Counts per gram
+CAL = load_calibration(calibration_path("/home/cloudy7/iotreat", "IOTreat", "bowl"),
+                       default_offset=-131480, default_scale=1563.7)
+OFFSET = CAL.offset   # No-load raw reading
+SCALE = CAL.scale     # Counts per gram
+print(f"Calibration rev {CAL.revision} ({CAL.source})")
 
 # ------------------------------
 # HX711 Setup
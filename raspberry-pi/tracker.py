@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Lightweight IoU / centroid tracker on top of the detector output.
+
+- Tracks get IDs and must be matched on `confirm_frames` detector passes
+  before they count (single-frame false positives never reach the motor).
+- Between keyframes the detector is skipped and tracks are propagated with
+  their last velocity; full inference runs every `keyframe_every` frames, or
+  every frame while a tentative track is waiting for confirmation.
+"""
+
+import numpy as np
+
+from detections import xyxy
+
+
+def iou_matrix(a, b):
+    """IoU between xyxy boxes a[N,4] and b[M,4]."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class Track:
+    __slots__ = ("track_id", "cls", "box", "conf", "hits", "misses", "velocity",
+                 "frames_since_update", "confirmed")
+
+    def __init__(self, track_id, cls, box, conf):
+        self.track_id = track_id
+        self.cls = cls
+        self.box = np.asarray(box, dtype=np.float32)
+        self.conf = conf
+        self.hits = 1
+        self.misses = 0
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.frames_since_update = 0
+        self.confirmed = False
+
+    def center(self, box=None):
+        b = self.box if box is None else box
+        return np.array([(b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0], dtype=np.float32)
+
+    def as_tuple(self, names):
+        x1, y1, x2, y2 = (int(v) for v in self.box)
+        return (names[self.cls], round(float(self.conf), 3), x1, y1, x2, y2, self.track_id)
+
+
+class IoUTracker:
+    """
+    iou_threshold   minimum IoU to associate a detection with a track
+    confirm_frames  detector hits needed before a track is confirmed
+    max_misses      detector passes a track may go unmatched before it is dropped
+    keyframe_every  run the detector every k-th frame while all tracks are confirmed
+    """
+
+    def __init__(self, iou_threshold=0.3, confirm_frames=3, max_misses=3, keyframe_every=5):
+        self.iou_threshold = iou_threshold
+        self.confirm_frames = confirm_frames
+        self.max_misses = max_misses
+        self.keyframe_every = keyframe_every
+
+        self.tracks = []
+        self._next_id = 1
+        self._since_keyframe = 0
+
+        # Counters
+        self.keyframes = 0
+        self.propagated = 0
+
+    def needs_detection(self):
+        """True when this frame should get a full detector pass."""
+        if not self.tracks:
+            return True
+        if any(not t.confirmed for t in self.tracks):
+            return True
+        return self._since_keyframe + 1 >= self.keyframe_every
+
+    def predict(self):
+        """Non-keyframe: move tracks along their velocity, no detector."""
+        for t in self.tracks:
+            dx, dy = t.velocity
+            t.box += np.array([dx, dy, dx, dy], dtype=np.float32)
+            t.frames_since_update += 1
+        self._since_keyframe += 1
+        self.propagated += 1
+        return self.tracks
+
+    def _match(self, boxes, classes):
+        """Greedy association; IoU first, centroid distance as a fallback."""
+        if not self.tracks or len(boxes) == 0:
+            return [], list(range(len(self.tracks))), list(range(len(boxes)))
+
+        tboxes = np.stack([t.box for t in self.tracks])
+        tcls = np.array([t.cls for t in self.tracks])
+        iou = iou_matrix(tboxes, boxes)
+
+        # Centroid fallback for fast movers whose boxes no longer overlap enough;
+        # always ranks below any IoU match.
+        tc = (tboxes[:, :2] + tboxes[:, 2:]) / 2.0
+        dc = (boxes[:, :2] + boxes[:, 2:]) / 2.0
+        dist = np.linalg.norm(tc[:, None, :] - dc[None, :, :], axis=2)
+        reach = 0.5 * np.maximum(tboxes[:, 2] - tboxes[:, 0], tboxes[:, 3] - tboxes[:, 1])[:, None]
+        by_iou = iou >= self.iou_threshold
+        by_centroid = ~by_iou & (dist < reach)
+
+        score = np.where(by_iou, iou, 0.0)
+        score = np.where(by_centroid, 0.5 * self.iou_threshold * (1.0 - dist / (reach + 1e-9)), score)
+        valid = (by_iou | by_centroid) & (tcls[:, None] == classes[None, :])
+
+        matches = []
+        used_t, used_d = set(), set()
+        for flat in np.argsort(-score, axis=None):
+            ti, di = np.unravel_index(flat, score.shape)
+            if not valid[ti, di]:
+                continue
+            if ti in used_t or di in used_d:
+                continue
+            matches.append((int(ti), int(di)))
+            used_t.add(ti)
+            used_d.add(di)
+
+        unmatched_t = [i for i in range(len(self.tracks)) if i not in used_t]
+        unmatched_d = [j for j in range(len(boxes)) if j not in used_d]
+        return matches, unmatched_t, unmatched_d
+
+    def update(self, dets):
+        """Keyframe: associate a detections structured array with the tracks."""
+        boxes = xyxy(dets) if len(dets) else np.zeros((0, 4), np.float32)
+        classes = dets["cls"].astype(np.int64) if len(dets) else np.zeros(0, np.int64)
+
+        matches, unmatched_t, unmatched_d = self._match(boxes, classes)
+
+        for ti, di in matches:
+            t = self.tracks[ti]
+            steps = max(1, t.frames_since_update + 1)
+            step_v = (t.center(boxes[di]) - t.center()) / steps
+            t.velocity = 0.5 * t.velocity + 0.5 * step_v
+            t.box = boxes[di].copy()
+            t.conf = float(dets["conf"][di])
+            t.hits += 1
+            t.misses = 0
+            t.frames_since_update = 0
+            if t.hits >= self.confirm_frames:
+                t.confirmed = True
+
+        for ti in unmatched_t:
+            t = self.tracks[ti]
+            t.misses += 1
+            t.frames_since_update = 0
+            t.velocity[:] = 0.0
+
+        for di in unmatched_d:
+            self.tracks.append(Track(self._next_id, int(classes[di]), boxes[di], float(dets["conf"][di])))
+            self._next_id += 1
+
+        # Tentative tracks must match on consecutive passes; confirmed ones get some slack
+        self.tracks = [t for t in self.tracks
+                       if t.misses == 0 or (t.confirmed and t.misses <= self.max_misses)]
+        self._since_keyframe = 0
+        self.keyframes += 1
+        return self.tracks
+
+    def confirmed(self):
+        return [t for t in self.tracks if t.confirmed]
+
+    def present_species(self, names, preferred=("cat", "dog")):
+        """Species of the best confirmed track (pets first), or None."""
+        tracks = self.confirmed()
+        if not tracks:
+            return None
+        pets = [t for t in tracks if names[t.cls] in preferred]
+        return names[max(pets or tracks, key=lambda t: t.conf).cls]
+
+    def stats(self):
+        total = self.keyframes + self.propagated
+        return {
+            "tracks": len(self.tracks),
+            "confirmed": len(self.confirmed()),
+            "keyframes": self.keyframes,
+            "propagated": self.propagated,
+            "keyframe_ratio": round(self.keyframes / total, 3) if total else 0.0,
+        }
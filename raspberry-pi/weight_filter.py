@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Streaming filter for HX711 weight readings.
+
+Per sample (constant work, fixed small windows):
+  1. spike rejection: a jump faster than max_rate_gps from the last accepted
+     value is dropped, unless it persists for spike_confirm samples (a real
+     step, e.g. the bowl was put back)
+  2. rolling median over the last median_n accepted samples
+  3. smoother: exponential moving average or a 1-D Kalman filter
+Noise and rejection statistics are tracked along the way.
+"""
+
+import bisect
+import math
+from collections import deque
+
+
+class WeightFilter:
+    """
+    median_n       rolling median window (samples)
+    smoother       "ema" or "kalman"
+    alpha          EMA factor (0..1, higher = faster)
+    process_var    Kalman process noise, g^2 per second
+    measure_var    Kalman measurement noise, g^2
+    max_rate_gps   largest believable change rate in g/s (dispensing is well below this)
+    spike_confirm  consecutive out-of-range samples that are accepted as a real step
+    min_dt_s       shortest believable time between samples (HX711 at 80 SPS); the
+                   rate check never divides by less, even for identical timestamps
+    """
+
+    def __init__(self, median_n=5, smoother="ema", alpha=0.35,
+                 process_var=50.0, measure_var=4.0,
+                 max_rate_gps=300.0, spike_confirm=3, min_dt_s=1 / 80.0):
+        if smoother not in ("ema", "kalman"):
+            raise ValueError(f"Unknown smoother: {smoother}")
+        self.median_n = median_n
+        self.smoother = smoother
+        self.alpha = alpha
+        self.process_var = process_var
+        self.measure_var = measure_var
+        self.max_rate_gps = max_rate_gps
+        self.spike_confirm = spike_confirm
+        self.min_dt_s = min_dt_s
+        self.reset()
+
+        self.samples = 0
+        self.rejected = 0
+
+    def reset(self):
+        """Forget the signal state (e.g. after a tare / calibration change)."""
+        self._window = deque()
+        self._sorted = []
+        self._last_ts = None
+        self._last_accepted = None
+        self._pending_spikes = 0
+        self.value = None
+        self._p = self.measure_var
+        self._noise_var = 0.0
+
+    def shift(self, delta_g):
+        """Move the signal state by delta_g (e.g. a small tare correction) without a reset."""
+        if self._last_accepted is not None:
+            self._last_accepted += delta_g
+        if self.value is not None:
+            self.value += delta_g
+        self._window = deque(x + delta_g for x in self._window)
+        self._sorted = [x + delta_g for x in self._sorted]
+
+    def _median(self, x):
+        if len(self._window) == self.median_n:
+            old = self._window.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._window.append(x)
+        bisect.insort(self._sorted, x)
+        n = len(self._sorted)
+        mid = n // 2
+        return self._sorted[mid] if n % 2 else 0.5 * (self._sorted[mid - 1] + self._sorted[mid])
+
+    def update(self, ts, grams):
+        """Feed one sample; returns the filtered value (unchanged if the sample was rejected)."""
+        self.samples += 1
+        if grams is None or not math.isfinite(grams):
+            self.rejected += 1
+            return self.value
+
+        if self._last_accepted is not None:
+            dt = max(self.min_dt_s, ts - self._last_ts)
+            if abs(grams - self._last_accepted) / dt > self.max_rate_gps:
+                self._pending_spikes += 1
+                if self._pending_spikes < self.spike_confirm:
+                    self.rejected += 1
+                    return self.value
+                # The "spike" persisted: it is a real step. Restart from here.
+                self.reset()
+        self._pending_spikes = 0
+        dt = ts - self._last_ts if self._last_ts is not None else 0.0
+        self._last_ts = ts
+        self._last_accepted = grams
+
+        m = self._median(grams)
+        if self.value is None:
+            self.value = m
+            return self.value
+
+        if self.smoother == "ema":
+            self.value += self.alpha * (m - self.value)
+        else:
+            self._p += self.process_var * dt
+            k = self._p / (self._p + self.measure_var)
+            self.value += k * (m - self.value)
+            self._p *= (1.0 - k)
+
+        resid = grams - self.value
+        self._noise_var += 0.05 * (resid * resid - self._noise_var)
+        return self.value
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "rejected": self.rejected,
+            "rejection_rate": round(self.rejected / self.samples, 4) if self.samples else 0.0,
+            "noise_g": round(math.sqrt(self._noise_var), 3),
+        }